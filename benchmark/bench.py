@@ -0,0 +1,657 @@
+"""bilisum离线基准测试
+
+在本地模拟B站API及CDN、语音识别和LLM，驱动 BiliSumPlugin.video_review 与 process_video，
+统计吞吐量、各阶段耗时、峰值内存及磁盘读写，结果保存为JSON便于不同版本之间对比。
+
+需要在安装了AstrBot及插件依赖的环境中运行，系统中需要有FFmpeg：
+
+    python benchmark/bench.py --videos 20 --concurrency 4
+    python benchmark/bench.py --videos 20 --concurrency 4 --set asr_audio_profile=original --compare 上次结果.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import types
+import urllib.parse
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+import httpx
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+import main  # noqa: E402
+
+# 模拟LLM的回复前缀，用于区分点评成功和各种错误提示
+REVIEW_MARKER = "【基准测试点评】"
+AID_BASE = 100000
+CID_BASE = 200000
+
+
+def bench_bvid(index):
+    return f"BV1bench{index:04d}"
+
+
+def bench_index(bvid=None, aid=None):
+    if aid is not None:
+        return int(aid) - AID_BASE
+    return int(bvid[len("BV1bench"):])
+
+
+def summarize(values):
+    """计算耗时样本的次数、均值和分位数"""
+    values = sorted(values)
+    if not values:
+        return {"count": 0}
+
+    def percentile(q):
+        return values[min(int(round(q / 100 * (len(values) - 1))), len(values) - 1)]
+
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values),
+        "p50": percentile(50),
+        "p95": percentile(95),
+        "max": values[-1],
+    }
+
+
+class Fixtures:
+    """测试用的视频、音频和字幕素材"""
+
+    def __init__(self, directory, duration, ffmpeg_path):
+        self.directory = directory
+        self.duration = duration
+        self.ffmpeg_path = ffmpeg_path
+        self.video_path = os.path.join(directory, f"video_{duration}s.mp4")
+        self.audio_path = os.path.join(directory, f"audio_{duration}s.m4a")
+
+    def prepare(self):
+        """生成360p测试视频及对应的纯音频文件，已存在时直接复用
+
+        音频为每10秒中3秒静音的正弦波，可用于对比静音裁剪的效果。
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        if not os.path.exists(self.video_path):
+            self._ffmpeg([
+                '-f', 'lavfi', '-i', 'testsrc=size=640x360:rate=25',
+                '-f', 'lavfi', '-i', 'sine=frequency=440:sample_rate=44100',
+                '-t', str(self.duration),
+                '-af', "volume='if(lt(mod(t,10),7),1,0)':eval=frame",
+                '-c:v', 'mpeg4', '-q:v', '10',
+                '-c:a', 'aac', '-b:a', '128k', '-ac', '2',
+                self.video_path
+            ])
+        if not os.path.exists(self.audio_path):
+            self._ffmpeg(['-i', self.video_path, '-vn', '-c:a', 'copy', self.audio_path])
+
+    def _ffmpeg(self, args):
+        subprocess.run([self.ffmpeg_path, '-y', '-loglevel', 'error', *args], check=True)
+
+    def subtitle_body(self):
+        return {
+            "body": [
+                {"from": start, "to": start + 2.5, "content": f"第{start // 3 + 1}句字幕内容"}
+                for start in range(0, self.duration, 3)
+            ]
+        }
+
+
+class FakeBiliServer:
+    """模拟B站API和CDN的本地HTTP服务器
+
+    提供playurl接口、DASH音频流、MP4视频流及字幕文件，视频流支持Range请求，
+    可以设置接口延迟和CDN带宽。
+    """
+
+    def __init__(self, fixtures, api_latency=0.0, bandwidth_mbps=0.0, dash=True):
+        self.fixtures = fixtures
+        self.api_latency = api_latency
+        self.bytes_per_second = bandwidth_mbps * 1024 * 1024 / 8
+        self.dash = dash
+        self.port = None
+        self.stats = {"requests": 0, "api_requests": 0, "range_requests": 0, "bytes_sent": 0, "connections": 0}
+        self._server = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _handle(self, reader, writer):
+        self.stats["connections"] += 1
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                _, target, _ = request_line.decode().split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode().partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                self.stats["requests"] += 1
+                await self._respond(writer, urllib.parse.urlsplit(target), headers)
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, writer, url, headers):
+        path = url.path
+        query = urllib.parse.parse_qs(url.query)
+        if path == "/x/player/playurl":
+            self.stats["api_requests"] += 1
+            await asyncio.sleep(self.api_latency)
+            await self._send_json(writer, self._playurl(query))
+        elif path.startswith("/subtitle/"):
+            self.stats["api_requests"] += 1
+            await asyncio.sleep(self.api_latency)
+            await self._send_json(writer, self.fixtures.subtitle_body())
+        elif path.startswith("/audio/"):
+            await self._send_file(writer, self.fixtures.audio_path, headers.get("range"))
+        elif path.startswith("/video/"):
+            await self._send_file(writer, self.fixtures.video_path, headers.get("range"))
+        else:
+            await self._send(writer, 404, {}, b"not found")
+
+    def _playurl(self, query):
+        cid = query.get("cid", ["0"])[0]
+        if "fnval" in query:
+            audio = []
+            if self.dash:
+                audio = [{
+                    "id": 30216,
+                    "bandwidth": 64000,
+                    "baseUrl": f"https://upos-bench.bilivideo.com/audio/{cid}.m4s",
+                    "backupUrl": [f"https://upos-bench-backup.bilivideo.com/audio/{cid}.m4s"],
+                }]
+            return {"code": 0, "data": {"dash": {"audio": audio}}}
+        return {"code": 0, "data": {"durl": [{"url": f"https://upos-bench.bilivideo.com/video/{cid}.mp4"}]}}
+
+    async def _send_json(self, writer, data):
+        await self._send(writer, 200, {"Content-Type": "application/json"}, json.dumps(data).encode())
+
+    async def _send(self, writer, status, headers, body):
+        reason = {200: "OK", 206: "Partial Content", 404: "Not Found", 416: "Range Not Satisfiable"}[status]
+        lines = [f"HTTP/1.1 {status} {reason}", f"Content-Length: {len(body)}"]
+        lines.extend(f"{name}: {value}" for name, value in headers.items())
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode() + body)
+        await writer.drain()
+        self.stats["bytes_sent"] += len(body)
+
+    async def _send_file(self, writer, path, range_header):
+        size = os.path.getsize(path)
+        offset = 0
+        status = 200
+        headers = {"Content-Type": "application/octet-stream", "Accept-Ranges": "bytes"}
+        if range_header and range_header.startswith("bytes="):
+            self.stats["range_requests"] += 1
+            offset = int(range_header[len("bytes="):].split("-", 1)[0] or 0)
+            if offset >= size:
+                await self._send(writer, 416, {"Content-Range": f"bytes */{size}"}, b"")
+                return
+            status = 206
+            headers["Content-Range"] = f"bytes {offset}-{size - 1}/{size}"
+
+        lines = [f"HTTP/1.1 {status} {'OK' if status == 200 else 'Partial Content'}", f"Content-Length: {size - offset}"]
+        lines.extend(f"{name}: {value}" for name, value in headers.items())
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode())
+
+        # 按块发送，设置了带宽时每块发送后等待相应的时间
+        chunk_size = 64 * 1024
+        with open(path, "rb") as f:
+            f.seek(offset)
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                writer.write(chunk)
+                await writer.drain()
+                self.stats["bytes_sent"] += len(chunk)
+                if self.bytes_per_second:
+                    await asyncio.sleep(len(chunk) / self.bytes_per_second)
+
+
+class LocalTransport(httpx.AsyncBaseTransport):
+    """将插件发往B站及CDN的请求转发到本地模拟服务器"""
+
+    def __init__(self, port, limits):
+        self.port = port
+        self.transport = httpx.AsyncHTTPTransport(limits=limits)
+
+    async def handle_async_request(self, request):
+        request.url = request.url.copy_with(scheme="http", host="127.0.0.1", port=self.port)
+        return await self.transport.handle_async_request(request)
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+def make_fake_video_class(fixtures, api_latency, native_ratio, stats):
+    """生成替代 bilibili_api.video.Video 的类
+
+    bilibili_api使用自己的HTTP会话访问接口，无法转发到本地服务器，因此直接替换视频对象。
+    """
+
+    class FakeVideo:
+        def __init__(self, bvid=None, aid=None, credential=None):
+            self.index = bench_index(bvid, aid)
+
+        def get_bvid(self):
+            return bench_bvid(self.index)
+
+        async def get_info(self):
+            stats["video_info_calls"] += 1
+            await asyncio.sleep(api_latency)
+            cid = CID_BASE + self.index
+            return {
+                "bvid": self.get_bvid(),
+                "aid": AID_BASE + self.index,
+                "cid": cid,
+                "title": f"基准测试视频{self.index}",
+                "desc": "离线基准测试使用的视频",
+                "duration": fixtures.duration,
+                "pages": [{"cid": cid, "page": 1, "part": "P1", "duration": fixtures.duration}],
+            }
+
+        async def get_subtitle(self, cid):
+            stats["subtitle_calls"] += 1
+            await asyncio.sleep(api_latency)
+            # 按编号确定性地让一部分视频带有AI字幕
+            if (self.index * 37) % 100 >= native_ratio * 100:
+                return {"subtitles": []}
+            return {"subtitles": [{
+                "lan": "ai-zh",
+                "lan_doc": "中文（自动生成）",
+                "subtitle_url": f"//aisubtitle.hdslb.com/subtitle/{cid}.json",
+            }]}
+
+    return FakeVideo
+
+
+class StubProvider:
+    """模拟LLM提供商，固定延迟后返回回复"""
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.stats = {"calls": 0, "prompt_chars": 0}
+
+    async def text_chat(self, prompt=None, session_id=None, system_prompt=None, **kwargs):
+        self.stats["calls"] += 1
+        self.stats["prompt_chars"] += len(prompt or "")
+        await asyncio.sleep(self.delay)
+        return types.SimpleNamespace(role="assistant", completion_text=f"{REVIEW_MARKER}提示词{len(prompt or '')}字")
+
+
+class StubConversationManager:
+    """模拟对话管理器，只记录写入次数"""
+
+    def __init__(self):
+        self.histories = {}
+        self.stats = {"writes": 0}
+
+    async def get_curr_conversation_id(self, unified_msg_origin):
+        return unified_msg_origin
+
+    async def new_conversation(self, unified_msg_origin):
+        return unified_msg_origin
+
+    async def get_conversation(self, unified_msg_origin, conversation_id):
+        return types.SimpleNamespace(history=self.histories.get(unified_msg_origin, "[]"))
+
+    async def update_conversation(self, unified_msg_origin, conversation_id, history):
+        self.histories[unified_msg_origin] = history
+        self.stats["writes"] += 1
+
+
+class StubContext:
+    def __init__(self, data_path, provider):
+        self.data_path = data_path
+        self.provider = provider
+        self.conversation_manager = StubConversationManager()
+
+    def get_config(self):
+        return {"data_path": self.data_path}
+
+    def get_using_provider(self):
+        return self.provider
+
+
+class StubEvent:
+    def __init__(self, unified_msg_origin, message_str=""):
+        self.unified_msg_origin = unified_msg_origin
+        self.message_str = message_str
+
+    def request_llm(self, prompt, session_id=None, system_prompt=None, **kwargs):
+        return types.SimpleNamespace(prompt=prompt, session_id=session_id, system_prompt=system_prompt)
+
+
+class ResourceMonitor:
+    """记录峰值内存和磁盘读写量"""
+
+    def __init__(self, trace_python=False):
+        self.trace_python = trace_python
+
+    @staticmethod
+    def _rusage():
+        if resource is None:
+            return None
+        return resource.getrusage(resource.RUSAGE_SELF), resource.getrusage(resource.RUSAGE_CHILDREN)
+
+    @staticmethod
+    def _proc_io():
+        try:
+            with open("/proc/self/io", "r") as f:
+                return {name: int(value) for name, value in (line.split(": ") for line in f.read().splitlines())}
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _maxrss_bytes(usage):
+        # Linux下ru_maxrss单位为KB，macOS下为字节
+        return usage.ru_maxrss if sys.platform == "darwin" else usage.ru_maxrss * 1024
+
+    def start(self):
+        if self.trace_python:
+            tracemalloc.start()
+        self.start_rusage = self._rusage()
+        self.start_io = self._proc_io()
+
+    def stop(self):
+        result = {"memory": {}, "disk_io": {}}
+        end_rusage = self._rusage()
+        if end_rusage is not None:
+            self_usage, child_usage = end_rusage
+            start_self, start_child = self.start_rusage
+            result["memory"]["peak_rss_bytes"] = self._maxrss_bytes(self_usage)
+            result["memory"]["peak_child_rss_bytes"] = self._maxrss_bytes(child_usage)
+            # ru_inblock/ru_oublock以512字节为单位，子进程部分主要是FFmpeg
+            result["disk_io"]["read_bytes"] = (self_usage.ru_inblock - start_self.ru_inblock) * 512
+            result["disk_io"]["write_bytes"] = (self_usage.ru_oublock - start_self.ru_oublock) * 512
+            result["disk_io"]["child_read_bytes"] = (child_usage.ru_inblock - start_child.ru_inblock) * 512
+            result["disk_io"]["child_write_bytes"] = (child_usage.ru_oublock - start_child.ru_oublock) * 512
+        end_io = self._proc_io()
+        if end_io is not None and self.start_io is not None:
+            result["disk_io"]["syscall_read_bytes"] = end_io.get("rchar", 0) - self.start_io.get("rchar", 0)
+            result["disk_io"]["syscall_write_bytes"] = end_io.get("wchar", 0) - self.start_io.get("wchar", 0)
+        if self.trace_python:
+            result["memory"]["python_peak_bytes"] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        return result
+
+
+def directory_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def parse_overrides(items):
+    """解析 --set key=value 形式的插件配置，值按JSON解析，失败时作为字符串"""
+    overrides = {}
+    for item in items or []:
+        key, _, value = item.partition("=")
+        try:
+            overrides[key] = json.loads(value)
+        except ValueError:
+            overrides[key] = value
+    return overrides
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+async def run_benchmark(args):
+    ffmpeg_path = main.find_ffmpeg(args.ffmpeg_path)
+    if not ffmpeg_path:
+        raise SystemExit("未找到FFmpeg，请安装后重试或通过 --ffmpeg-path 指定")
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="bilisum_bench_")
+    fixtures = Fixtures(args.fixtures_dir or os.path.join(workdir, "fixtures"), args.duration, ffmpeg_path)
+    fixtures.prepare()
+
+    server = FakeBiliServer(fixtures, args.api_latency, args.cdn_bandwidth_mbps, dash=not args.no_dash)
+    await server.start()
+
+    fake_stats = {"video_info_calls": 0, "subtitle_calls": 0}
+    main.video.Video = make_fake_video_class(fixtures, args.api_latency, args.native_ratio, fake_stats)
+
+    config = {
+        "asr_backend": "fake",
+        "fake_asr_delay": args.asr_delay,
+        "fake_asr_seconds_per_mb": args.asr_seconds_per_mb,
+        "ffmpeg_path": ffmpeg_path,
+        "review_queue_size": max(args.concurrency * 2, 20),
+    }
+    config.update(parse_overrides(args.set))
+
+    provider = StubProvider(args.llm_delay)
+    context = StubContext(os.path.join(workdir, "data"), provider)
+    plugin = main.BiliSumPlugin(context, config)
+
+    # 替换为转发到本地服务器的客户端，连接池参数与插件配置一致
+    await plugin.http_client.aclose()
+    plugin.http_client = httpx.AsyncClient(
+        headers=main.DEFAULT_HEADERS,
+        timeout=httpx.Timeout(float(config.get("http_timeout", 30)), connect=float(config.get("http_connect_timeout", 10))),
+        transport=LocalTransport(server.port, httpx.Limits(
+            max_connections=max(int(config.get("http_max_connections", 20)), 1),
+            max_keepalive_connections=10,
+            keepalive_expiry=30.0
+        )),
+        follow_redirects=True
+    )
+
+    unique = max(int(round(args.videos * (1 - args.repeat_ratio))), 1)
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies = []
+    outcomes = {"succeeded": 0, "failed": 0}
+    errors = {}
+
+    async def one(index):
+        bvid = bench_bvid(index % unique)
+        event = StubEvent(f"bench:session{index % args.sessions}")
+        use_process = args.tool == "process" or (args.tool == "mixed" and index % 2)
+        async with semaphore:
+            started = time.perf_counter()
+            if use_process:
+                result = await plugin.process_video(event, bvid)
+            else:
+                result = await plugin.video_review(event, f"点评一下这个视频 https://www.bilibili.com/video/{bvid}")
+            latencies.append(time.perf_counter() - started)
+        if REVIEW_MARKER in result:
+            outcomes["succeeded"] += 1
+        else:
+            outcomes["failed"] += 1
+            errors[result[:80]] = errors.get(result[:80], 0) + 1
+
+    monitor = ResourceMonitor(trace_python=args.tracemalloc)
+    monitor.start()
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(one(index) for index in range(args.videos)))
+        wall_seconds = time.perf_counter() - started
+        await plugin.history_writer.flush()
+        counters, gauges = plugin._metric_values()
+        counters.update(plugin.metrics.counters)
+        stages = {stage: summarize(samples) for stage, samples in sorted(plugin.metrics.samples.items())}
+        data_bytes = directory_size(os.path.join(workdir, "data"))
+    finally:
+        await plugin.terminate()
+        await server.close()
+    resources = monitor.stop()
+
+    if not args.keep and not args.workdir:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    params = {key: value for key, value in vars(args).items() if key not in ("output", "compare")}
+    return {
+        "version": 1,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": params,
+        "plugin_config": config,
+        "requests": {
+            "total": args.videos,
+            "unique_videos": unique,
+            "wall_seconds": wall_seconds,
+            "throughput_per_minute": args.videos / wall_seconds * 60 if wall_seconds else None,
+            "latency": summarize(latencies),
+            "errors": errors,
+            **outcomes,
+        },
+        "stages": stages,
+        "counters": counters,
+        "memory": resources["memory"],
+        "disk_io": dict(resources["disk_io"], data_dir_bytes=data_bytes),
+        "server": dict(server.stats, **fake_stats),
+        "llm": provider.stats,
+        "history": context.conversation_manager.stats,
+    }
+
+
+def format_bytes(value):
+    if value is None:
+        return "-"
+    for unit in ("B", "KB", "MB", "GB"):
+        if abs(value) < 1024 or unit == "GB":
+            return f"{value:.1f}{unit}" if unit != "B" else f"{value}B"
+        value /= 1024
+
+
+def print_report(result):
+    requests = result["requests"]
+    latency = requests["latency"]
+    print(f"请求: {requests['total']}个（{requests['unique_videos']}个不同视频），"
+          f"成功 {requests['succeeded']}，失败 {requests['failed']}")
+    print(f"总耗时: {requests['wall_seconds']:.2f}s，吞吐量: {requests['throughput_per_minute']:.1f}个/分钟")
+    if latency["count"]:
+        print(f"单个请求耗时: p50 {latency['p50']:.2f}s / p95 {latency['p95']:.2f}s / max {latency['max']:.2f}s")
+    for message, count in requests["errors"].items():
+        print(f"  失败 x{count}: {message}")
+
+    print("\n各阶段耗时 (次数 / p50 / p95):")
+    for stage, summary in result["stages"].items():
+        print(f"  {stage}: {summary['count']}次 / {summary['p50']:.3f}s / {summary['p95']:.3f}s")
+
+    print("\n内存及磁盘:")
+    for name, value in list(result["memory"].items()) + list(result["disk_io"].items()):
+        print(f"  {name}: {format_bytes(value)}")
+    print(f"  识别音频总大小: {format_bytes(result['counters'].get('asr_audio_bytes', 0))}")
+
+
+def compare_metrics(result):
+    """提取用于对比的关键指标"""
+    metrics = {
+        "throughput_per_minute": result["requests"]["throughput_per_minute"],
+        "request_p50_s": result["requests"]["latency"].get("p50"),
+        "request_p95_s": result["requests"]["latency"].get("p95"),
+    }
+    for stage, summary in result["stages"].items():
+        metrics[f"{stage}_p50_s"] = summary.get("p50")
+    for name in ("peak_rss_bytes", "peak_child_rss_bytes", "python_peak_bytes"):
+        metrics[name] = result["memory"].get(name)
+    metrics.update(result["disk_io"])
+    metrics["asr_audio_bytes"] = result["counters"].get("asr_audio_bytes")
+    return metrics
+
+
+def print_comparison(baseline, result):
+    old_metrics = compare_metrics(baseline)
+    new_metrics = compare_metrics(result)
+    print(f"\n与基准 {baseline.get('git_commit')} ({baseline.get('timestamp')}) 对比:")
+    for name in sorted(set(old_metrics) | set(new_metrics)):
+        old, new = old_metrics.get(name), new_metrics.get(name)
+        if old is None or new is None:
+            continue
+        change = f"{(new - old) / old:+.1%}" if old else "-"
+        if name.endswith("_bytes"):
+            print(f"  {name}: {format_bytes(old)} -> {format_bytes(new)} ({change})")
+        else:
+            print(f"  {name}: {old:.3f} -> {new:.3f} ({change})")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="bilisum离线基准测试")
+    parser.add_argument("--videos", type=int, default=20, help="请求总数")
+    parser.add_argument("--concurrency", type=int, default=4, help="同时发起的请求数")
+    parser.add_argument("--sessions", type=int, default=4, help="请求分布在多少个会话中")
+    parser.add_argument("--tool", choices=("review", "process", "mixed"), default="mixed",
+                        help="调用video_review、process_video或交替调用")
+    parser.add_argument("--duration", type=int, default=120, help="测试视频时长（秒）")
+    parser.add_argument("--repeat-ratio", type=float, default=0.0, help="重复请求同一视频的比例，用于测试缓存")
+    parser.add_argument("--native-ratio", type=float, default=0.0, help="带有AI字幕的视频比例")
+    parser.add_argument("--no-dash", action="store_true", help="不提供DASH音频流，强制下载MP4")
+    parser.add_argument("--api-latency", type=float, default=0.05, help="模拟接口延迟（秒）")
+    parser.add_argument("--cdn-bandwidth-mbps", type=float, default=0.0, help="模拟CDN带宽（Mbps），0表示不限制")
+    parser.add_argument("--asr-delay", type=float, default=0.5, help="模拟语音识别耗时（秒）")
+    parser.add_argument("--asr-seconds-per-mb", type=float, default=2.0,
+                        help="每MB音频增加的识别耗时（秒），默认约相当于4Mbps上行带宽的上传时间")
+    parser.add_argument("--llm-delay", type=float, default=0.5, help="模拟LLM回复耗时（秒）")
+    parser.add_argument("--set", action="append", metavar="KEY=VALUE", help="覆盖插件配置，可重复使用")
+    parser.add_argument("--ffmpeg-path", default="", help="FFmpeg路径，默认从PATH中查找")
+    parser.add_argument("--fixtures-dir", help="测试素材目录，指定后可在多次运行之间复用")
+    parser.add_argument("--workdir", help="插件数据目录，默认使用临时目录并在结束后删除")
+    parser.add_argument("--keep", action="store_true", help="保留临时目录")
+    parser.add_argument("--tracemalloc", action="store_true", help="统计Python堆内存峰值（会降低运行速度）")
+    parser.add_argument("--output", help="结果JSON的保存路径")
+    parser.add_argument("--compare", help="与之前保存的结果JSON对比")
+    parser.add_argument("--verbose", action="store_true", help="输出插件日志")
+    return parser.parse_args(argv)
+
+
+def main_entry(argv=None):
+    args = parse_args(argv)
+    if not args.verbose:
+        main.logger.setLevel(logging.WARNING)
+        logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    result = asyncio.run(run_benchmark(args))
+    print_report(result)
+
+    output = args.output or f"bilisum_bench_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print(f"\n结果已保存到: {output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            print_comparison(json.load(f), result)
+
+
+if __name__ == "__main__":
+    main_entry()
@@ -0,0 +1,88 @@
+"""字幕压缩的效果和耗时
+
+对 subtitle.txt 及由它生成的较长字幕运行 compress_transcript，输出压缩前后的token数和耗时。
+也可以用 --files 指定其他 `开始 -> 结束: 文本` 格式的字幕文件（例如 data/bilisum/subtitles 中的缓存）。
+
+    python benchmark/bench_compress.py --budgets 500 1500 3000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import main  # noqa: E402
+from bench import summarize  # noqa: E402
+
+
+def load_subtitle(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return main.Transcript.load(f.read()).to_txt()
+
+
+def build_fixtures(base_text, files, rng):
+    """生成测试用的字幕文本
+
+    long_asr模拟一小时视频的识别结果：重复原字幕并混入少量变化，含大量重复句；
+    unpunctuated模拟没有标点、没有分段的识别结果。
+    """
+    lines = base_text.splitlines()
+    long_lines = []
+    while len(long_lines) < 1200:
+        for line in lines:
+            long_lines.append(line if rng.random() < 0.6 else f"{line}{rng.choice('啊吧呢嘛')}{rng.randint(1, 99)}")
+    fixtures = {
+        "subtitle.txt": base_text,
+        "long_asr": "\n".join(long_lines),
+        "unpunctuated": "".join(line.replace(",", "").replace(" ", "") for line in long_lines[:300]),
+    }
+    for path in files or []:
+        fixtures[os.path.basename(path)] = load_subtitle(path)
+    return fixtures
+
+
+def main_entry(argv=None):
+    parser = argparse.ArgumentParser(description="字幕压缩的效果和耗时")
+    parser.add_argument("--budgets", type=int, nargs="+", default=[500, 1500, 3000], help="token预算")
+    parser.add_argument("--repeat", type=int, default=20, help="每项重复次数")
+    parser.add_argument("--files", nargs="*", help="额外的字幕文件")
+    parser.add_argument("--output", help="结果JSON的保存路径")
+    args = parser.parse_args(argv)
+
+    fixtures = build_fixtures(load_subtitle(os.path.join(REPO_ROOT, "subtitle.txt")), args.files, random.Random(0))
+    results = []
+    for name, text in fixtures.items():
+        tokens_before = main.estimate_tokens(text)
+        for budget in args.budgets:
+            timings = []
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                compressed = main.compress_transcript(text, budget)
+                timings.append(time.perf_counter() - started)
+            tokens_after = main.estimate_tokens(compressed)
+            timing = summarize(timings)
+            results.append({
+                "fixture": name,
+                "budget": budget,
+                "chars_before": len(text),
+                "tokens_before": tokens_before,
+                "tokens_after": tokens_after,
+                "ratio": tokens_after / tokens_before if tokens_before else None,
+                "seconds": timing,
+            })
+            print(f"{name} (预算{budget}): {tokens_before} -> {tokens_after} tokens "
+                  f"({tokens_after / max(tokens_before, 1):.0%})，p50 {timing['p50'] * 1000:.2f}ms "
+                  f"/ p95 {timing['p95'] * 1000:.2f}ms")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"params": vars(args), "results": results}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main_entry()
@@ -0,0 +1,72 @@
+"""对话历史写入开销随历史长度的变化
+
+HistoryWriter每次写入都要读取并重新序列化整个对话历史。同一会话连续写入多轮点评，
+分别在保留最近max_messages条记录和不限制（0）时，统计每轮写入的耗时和历史大小。
+限制条数时写入开销在历史达到上限后保持不变，不限制时随轮数线性增长。
+
+    python benchmark/bench_history.py --turns 500 --prompt-chars 3000
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import types
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import main  # noqa: E402
+from bench import StubConversationManager, summarize  # noqa: E402
+
+
+async def run_once(max_messages, turns, prompt_chars, windows):
+    manager = StubConversationManager()
+    writer = main.HistoryWriter(types.SimpleNamespace(conversation_manager=manager), max_messages=max_messages)
+    # 提示词中包含字幕，远长于点评本身
+    prompt = "字" * prompt_chars
+    reply = "评" * 300
+    window = max(turns // windows, 1)
+    timings = []
+    results = []
+    for turn in range(1, turns + 1):
+        writer.append("bench:session", prompt, reply)
+        started = time.perf_counter()
+        await writer.flush()
+        timings.append(time.perf_counter() - started)
+        if turn % window == 0 or turn == turns:
+            results.append({
+                "turns": turn,
+                "history_bytes": len(manager.histories["bench:session"].encode()),
+                "seconds": summarize(timings),
+            })
+            timings = []
+    return results
+
+
+def main_entry(argv=None):
+    parser = argparse.ArgumentParser(description="对话历史写入开销随历史长度的变化")
+    parser.add_argument("--turns", type=int, default=500, help="写入的对话轮数")
+    parser.add_argument("--prompt-chars", type=int, default=3000, help="每轮提示词的字数")
+    parser.add_argument("--max-messages", type=int, nargs="+", default=[100, 0], help="保留的记录条数，0为不限制")
+    parser.add_argument("--windows", type=int, default=5, help="按轮数分成几段统计")
+    parser.add_argument("--output", help="结果JSON的保存路径")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for max_messages in args.max_messages:
+        results[max_messages] = asyncio.run(run_once(max_messages, args.turns, args.prompt_chars, args.windows))
+        print(f"max_messages={max_messages}:")
+        for item in results[max_messages]:
+            print(f"  第{item['turns']}轮: 历史 {item['history_bytes'] / 1024:.0f}KB，"
+                  f"每轮写入 p50 {item['seconds']['p50'] * 1000:.2f}ms / p95 {item['seconds']['p95'] * 1000:.2f}ms")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"params": vars(args), "results": results}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main_entry()
@@ -0,0 +1,127 @@
+"""共享连接池与每次请求新建客户端的对比
+
+对本地模拟接口并发发送请求，分别使用 bili_request 不传client（每次新建客户端，原先的做法）
+和传入 create_http_client 创建的共享客户端，输出每秒请求数及p50/p95耗时。
+
+    python benchmark/bench_http_client.py --requests 500 --concurrency 20 --latency 0.01
+
+本地回环地址上建立连接的开销远小于访问B站时的TCP+TLS握手，实际差距会比这里更大。
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import main  # noqa: E402
+from bench import summarize  # noqa: E402
+
+RESPONSE = json.dumps({"code": 0, "data": {"bvid": "BV1xx411c7mD", "title": "基准测试"}}).encode()
+
+
+class JSONServer:
+    """返回固定JSON的本地HTTP服务器，记录建立的连接数"""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.connections = 0
+        self.port = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                if not await reader.readline():
+                    break
+                while await reader.readline() not in (b"\r\n", b"\n", b""):
+                    pass
+                await asyncio.sleep(self.latency)
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                    + f"Content-Length: {len(RESPONSE)}\r\n\r\n".encode() + RESPONSE
+                )
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+async def run_mode(mode, url, requests, concurrency):
+    client = main.create_http_client() if mode == "shared" else None
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    failures = 0
+
+    async def one():
+        nonlocal failures
+        async with semaphore:
+            started = time.perf_counter()
+            result = await main.bili_request(url, client=client)
+            latencies.append(time.perf_counter() - started)
+            if result.get("code") != 0:
+                failures += 1
+
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(one() for _ in range(requests)))
+    finally:
+        if client is not None:
+            await client.aclose()
+    wall_seconds = time.perf_counter() - started
+    return {
+        "requests_per_second": requests / wall_seconds,
+        "wall_seconds": wall_seconds,
+        "failures": failures,
+        "latency": summarize(latencies),
+    }
+
+
+async def run(args):
+    results = {}
+    for mode in ("per_call", "shared"):
+        server = JSONServer(args.latency)
+        await server.start()
+        try:
+            results[mode] = await run_mode(mode, f"http://127.0.0.1:{server.port}/x/web-interface/view",
+                                           args.requests, args.concurrency)
+            results[mode]["connections"] = server.connections
+        finally:
+            await server.close()
+    return results
+
+
+def main_entry(argv=None):
+    parser = argparse.ArgumentParser(description="共享连接池与每次新建客户端的对比")
+    parser.add_argument("--requests", type=int, default=500, help="每种模式的请求总数")
+    parser.add_argument("--concurrency", type=int, default=20, help="同时发起的请求数")
+    parser.add_argument("--latency", type=float, default=0.01, help="模拟接口延迟（秒）")
+    parser.add_argument("--output", help="结果JSON的保存路径")
+    args = parser.parse_args(argv)
+
+    results = asyncio.run(run(args))
+    for mode, result in results.items():
+        latency = result["latency"]
+        print(f"{mode}: {result['requests_per_second']:.1f} 请求/秒，p50 {latency['p50'] * 1000:.1f}ms，"
+              f"p95 {latency['p95'] * 1000:.1f}ms，连接数 {result['connections']}，失败 {result['failures']}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"params": vars(args), "results": results}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main_entry()
@@ -0,0 +1,80 @@
+"""消息过滤正则及视频解析的吞吐量
+
+handle_message通过VIDEO_MESSAGE_REGEX过滤消息，每条群消息都会经过这一步；匹配后再由
+_parse_video_refs提取BV号和分P。分别统计普通聊天、包含视频的消息和长文本的每秒处理条数。
+
+    python benchmark/bench_message_regex.py --seconds 1
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+import main  # noqa: E402
+
+CHAT = [
+    "今天晚上吃什么", "哈哈哈哈哈哈", "有人打游戏吗", "这个navigation栏怎么改", "brave浏览器好用吗",
+    "明天早上九点开会，记得带电脑", "[图片]", "@全体成员 周末团建", "av画质太差了", "ok",
+]
+VIDEO = [
+    "点评一下BV1GJ411x7h7",
+    "https://www.bilibili.com/video/BV1GJ411x7h7/?spm_id_from=333.1007.tianma.1-1-1.click&vd_source=abc",
+    "【合集】https://www.bilibili.com/video/BV1GJ411x7h7?p=3 这集讲得好",
+    "先看BV1GJ411x7h7再看BV17x411w7KC?p=4",
+    "https://www.bilibili.com/video/av170001",
+]
+
+
+def long_message(rng, size):
+    return "".join(rng.choice(CHAT) for _ in range(size // 8))[:size]
+
+
+def measure(func, messages, seconds):
+    """在seconds秒内循环处理messages，返回每秒处理条数"""
+    count = 0
+    started = time.perf_counter()
+    deadline = started + seconds
+    while time.perf_counter() < deadline:
+        for message in messages:
+            func(message)
+        count += len(messages)
+    return count / (time.perf_counter() - started)
+
+
+def main_entry(argv=None):
+    parser = argparse.ArgumentParser(description="消息过滤正则及视频解析的吞吐量")
+    parser.add_argument("--seconds", type=float, default=1.0, help="每项测量的时长（秒）")
+    parser.add_argument("--long-chars", type=int, default=4000, help="长文本的字数")
+    parser.add_argument("--output", help="结果JSON的保存路径")
+    args = parser.parse_args(argv)
+
+    rng = random.Random(0)
+    pattern = re.compile(main.VIDEO_MESSAGE_REGEX)
+    parse = main.BiliSumPlugin._parse_video_refs
+    long_messages = [long_message(rng, args.long_chars) for _ in range(20)]
+    long_with_video = [text[:len(text) // 2] + VIDEO[1] + text[len(text) // 2:] for text in long_messages]
+
+    results = {
+        "filter_chat": measure(pattern.match, CHAT, args.seconds),
+        "filter_video": measure(pattern.match, VIDEO, args.seconds),
+        "filter_long_chat": measure(pattern.match, long_messages, args.seconds),
+        "filter_long_video": measure(pattern.match, long_with_video, args.seconds),
+        "parse_video": measure(parse, VIDEO, args.seconds),
+        "parse_long_video": measure(parse, long_with_video, args.seconds),
+    }
+    for name, value in results.items():
+        print(f"{name}: {value:,.0f} 条/秒")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"params": vars(args), "messages_per_second": results}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main_entry()
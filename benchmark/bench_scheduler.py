@@ -0,0 +1,131 @@
+"""点评任务调度器的负载测试
+
+用asyncio.sleep模拟下载、语音识别和LLM三个阶段，直接向ReviewScheduler提交任务，不访问网络。
+每轮突发中一个会话一次提交大量链接（刷屏的群聊），其余会话各提交少量链接，
+按会话类型统计从提交到完成的p50/p95/p99耗时、吞吐量以及因队列已满被拒绝的任务数。
+
+    python benchmark/bench_scheduler.py --workers 1 2 4 --bursts 5 --burst-size 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import main  # noqa: E402
+from bench import summarize  # noqa: E402
+
+
+def tail(values):
+    """在summarize的基础上增加p99"""
+    result = summarize(values)
+    if values:
+        ordered = sorted(values)
+        result["p99"] = ordered[min(int(round(0.99 * (len(ordered) - 1))), len(ordered) - 1)]
+    return result
+
+
+def make_stage_durations(args, rng):
+    """生成一个任务各阶段的耗时，命中缓存的任务跳过下载和语音识别"""
+    if rng.random() < args.cache_ratio:
+        return [rng.expovariate(1 / args.llm)]
+    return [rng.expovariate(1 / args.download), rng.expovariate(1 / args.asr), rng.expovariate(1 / args.llm)]
+
+
+async def stub_review(stages):
+    for seconds in stages:
+        await asyncio.sleep(seconds)
+    return "点评"
+
+
+async def run_once(args, workers, seed):
+    rng = random.Random(seed)
+    metrics = main.Metrics(max_samples=100000)
+    scheduler = main.ReviewScheduler(workers, args.max_pending, metrics)
+    latencies = {"burst": [], "quiet": []}
+    positions = {"burst": [], "quiet": []}
+    rejected = {"burst": 0, "quiet": 0}
+    waiters = []
+
+    async def track(kind, future, submitted):
+        await future
+        latencies[kind].append(time.perf_counter() - submitted)
+
+    def submit(kind, session):
+        try:
+            future, position = scheduler.submit(session, stub_review, make_stage_durations(args, rng))
+        except main.QueueFullError:
+            rejected[kind] += 1
+            return
+        positions[kind].append(position)
+        waiters.append(asyncio.ensure_future(track(kind, future, time.perf_counter())))
+
+    started = time.perf_counter()
+    try:
+        for burst in range(args.bursts):
+            burst_started = time.perf_counter()
+            # 刷屏的会话一次提交burst_size个任务，其他会话随后陆续提交
+            for _ in range(args.burst_size):
+                submit("burst", f"group:burst{burst % 2}")
+            for index in range(args.quiet_sessions):
+                await asyncio.sleep(rng.uniform(0, args.burst_interval / args.quiet_sessions))
+                submit("quiet", f"group:quiet{index}")
+            await asyncio.sleep(max(args.burst_interval - (time.perf_counter() - burst_started), 0))
+        await asyncio.gather(*waiters)
+    finally:
+        await scheduler.close()
+    wall_seconds = time.perf_counter() - started
+
+    completed = sum(len(values) for values in latencies.values())
+    return {
+        "workers": workers,
+        "completed": completed,
+        "rejected": rejected,
+        "wall_seconds": wall_seconds,
+        "jobs_per_second": completed / wall_seconds,
+        "latency": {kind: tail(values) for kind, values in latencies.items()},
+        "queue_wait": tail(list(metrics.samples.get("queue_wait", []))),
+        "max_position": {kind: max(values, default=0) for kind, values in positions.items()},
+    }
+
+
+def main_entry(argv=None):
+    parser = argparse.ArgumentParser(description="点评任务调度器的负载测试")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="工作协程数，可指定多个进行对比")
+    parser.add_argument("--max-pending", type=int, default=50, help="排队任务上限")
+    parser.add_argument("--bursts", type=int, default=5, help="突发次数")
+    parser.add_argument("--burst-size", type=int, default=20, help="每次突发中刷屏会话提交的任务数")
+    parser.add_argument("--quiet-sessions", type=int, default=5, help="每次突发中只提交一个任务的会话数")
+    parser.add_argument("--burst-interval", type=float, default=0.5, help="两次突发之间的间隔（秒）")
+    parser.add_argument("--download", type=float, default=0.02, help="下载阶段的平均耗时（秒）")
+    parser.add_argument("--asr", type=float, default=0.05, help="语音识别阶段的平均耗时（秒）")
+    parser.add_argument("--llm", type=float, default=0.03, help="LLM阶段的平均耗时（秒）")
+    parser.add_argument("--cache-ratio", type=float, default=0.3, help="命中字幕缓存的任务比例")
+    parser.add_argument("--seed", type=int, default=0, help="随机数种子")
+    parser.add_argument("--output", help="结果JSON的保存路径")
+    args = parser.parse_args(argv)
+
+    results = []
+    for workers in args.workers:
+        result = asyncio.run(run_once(args, workers, args.seed))
+        results.append(result)
+        print(f"workers={workers}: {result['jobs_per_second']:.1f} 任务/秒，完成 {result['completed']}，"
+              f"拒绝 {sum(result['rejected'].values())}")
+        for kind, latency in result["latency"].items():
+            if latency["count"]:
+                print(f"  {kind}: p50 {latency['p50'] * 1000:.0f}ms，p95 {latency['p95'] * 1000:.0f}ms，"
+                      f"p99 {latency['p99'] * 1000:.0f}ms，最大排队位置 {result['max_position'][kind]}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"params": vars(args), "results": results}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main_entry()
@@ -4,9 +4,25 @@ import os
 #import requests
 from typing import Optional, List
 import asyncio
+import bisect
+import hashlib
+import importlib.util
+import math
+import random
+import re
+import shutil
+import signal
+import sqlite3
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
 import httpx
 from astrbot.api.all import *
-from bilibili_api import video, HEADERS, Credential
+from bilibili_api import video, user, HEADERS, Credential
+from bilibili_api.exceptions import ResponseCodeException
 from astrbot.api.event import filter, AstrMessageEvent, MessageEventResult
 from astrbot.api.star import Context, Star, register
 from bcut_asr import BcutASR
@@ -15,23 +31,1090 @@ from bcut_asr.orm import ResultStateEnum
 #import json
 
 
-async def bili_request(url, return_json=True):
-    """发送B站API请求"""
-    headers = {
-        "referer": "https://www.bilibili.com/",
-        "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36"
-    }
+# 消息中视频标识的匹配规则
+VIDEO_REF_PATTERN = re.compile(r'(BV[0-9A-Za-z]{10})|(?<![0-9A-Za-z])av(\d{3,})(?!\d)')
+# 分P参数只在同一个链接内查找，不跨过非URL字符或下一个视频
+PAGE_PATTERN = re.compile(r'(?:(?!BV[0-9A-Za-z]{10}|av\d)[!-~])*?[?&]p=(\d+)')
+SHORT_LINK_PATTERN = re.compile(r'(?:https?://)?(?:b23\.tv|bili2233\.cn)/[0-9A-Za-z]+')
+# 消息过滤器使用的正则，只有可能包含视频的消息才会进入处理流程
+VIDEO_MESSAGE_REGEX = r'(?s).*?(?:BV[0-9A-Za-z]{10}|(?<![0-9A-Za-z])av\d{3,}|b23\.tv/|bili2233\.cn/)'
 
-    try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
+# FFmpeg silencedetect输出的静音区间
+SILENCE_START_PATTERN = re.compile(r'silence_start: (-?[\d.]+)')
+SILENCE_END_PATTERN = re.compile(r'silence_end: (-?[\d.]+)')
+
+# 字幕文本中的换行
+LINE_BREAK_PATTERN = re.compile(r'\s*[\r\n]+\s*')
+
+# 用于估算token数的字符分类
+CJK_PATTERN = re.compile(r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af]')
+WORD_PATTERN = re.compile(r'[A-Za-z0-9]+')
+PUNCTUATION_PATTERN = re.compile(r'[^\w\s]')
+
+# tiktoken编码器，None表示尚未加载，False表示不可用
+_token_encoding = None
+
+# B站请求默认请求头
+DEFAULT_HEADERS = {
+    "referer": "https://www.bilibili.com/",
+    "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36"
+}
+
+
+def create_http_client(timeout=30.0, connect_timeout=10.0, max_connections=20, max_keepalive=10):
+    """创建带连接池的长连接HTTP客户端，安装了h2时启用HTTP/2"""
+    return httpx.AsyncClient(
+        headers=DEFAULT_HEADERS,
+        timeout=httpx.Timeout(timeout, connect=connect_timeout),
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=30.0
+        ),
+        http2=importlib.util.find_spec("h2") is not None,
+        follow_redirects=True
+    )
+
+
+def find_ffmpeg(configured_path=""):
+    """查找FFmpeg可执行文件，优先使用配置的路径，其次在PATH中查找"""
+    if configured_path:
+        return configured_path if os.path.exists(configured_path) else shutil.which(configured_path)
+    found = shutil.which("ffmpeg")
+    if found:
+        return found
+    # 兼容旧版通过pyffmpeg安装的FFmpeg
+    legacy_path = os.path.expanduser("~/.pyffmpeg/bin/ffmpeg")
+    return legacy_path if os.path.exists(legacy_path) else None
+
+
+def select_dash_audio(play_data):
+    """从playurl返回的DASH数据中选出码率最低的音频流
+
+    Returns:
+        list: 该音频流的主地址及备用地址，没有DASH音频时为空列表
+    """
+    audios = (play_data.get("dash") or {}).get("audio") or []
+    if not audios:
+        return []
+    audio = min(audios, key=lambda item: item.get("bandwidth") or 0)
+    urls = [audio.get("baseUrl") or audio.get("base_url")]
+    urls.extend(audio.get("backupUrl") or audio.get("backup_url") or [])
+    return [url for url in urls if url]
+
+
+def select_subtitle_track(subtitles):
+    """从播放器接口返回的字幕列表中选出最合适的一条
+
+    优先级：UP主上传的中文字幕 > AI生成的中文字幕 > 其他语言的上传字幕 > 其他AI字幕
+    """
+    tracks = [track for track in subtitles or [] if track.get("subtitle_url")]
+    if not tracks:
+        return None
+
+    def rank(track):
+        lan = (track.get("lan") or "").lower()
+        is_ai = lan.startswith("ai-") or track.get("type") == 1
+        is_zh = lan.replace("ai-", "").startswith("zh")
+        return (0 if is_zh else 1, 1 if is_ai else 0)
+
+    return min(tracks, key=rank)
+
+
+async def bili_request(url, return_json=True, client=None, max_retries=0):
+    """发送B站API请求
+
+    传入client时复用其连接池，否则临时创建一个客户端。
+    网络错误和5xx响应会按指数退避重试max_retries次。
+    """
+    headers = DEFAULT_HEADERS.copy()
+
+    if client is None:
+        async with httpx.AsyncClient(timeout=30.0) as temp_client:
+            return await bili_request(url, return_json, temp_client, max_retries)
+
+    for attempt in range(max_retries + 1):
+        try:
             response = await client.get(url, headers=headers)
             response.raise_for_status()
             if return_json:
                 return response.json()
             else:
                 return response.content
-    except (httpx.HTTPError, httpx.RequestError) as e:
-        return {"code": -400, "message": str(e)}
+        except (httpx.HTTPError, httpx.RequestError) as e:
+            retryable = not isinstance(e, httpx.HTTPStatusError) or e.response.status_code >= 500
+            if not retryable or attempt >= max_retries:
+                return {"code": -400, "message": str(e)}
+            await asyncio.sleep(min(0.5 * 2 ** attempt, 5))
+
+def estimate_tokens(text):
+    """估算文本的token数
+
+    安装了tiktoken时使用cl100k_base编码精确计算，否则按中日韩文字每字1个、
+    英文单词每个约1.3个、标点每个0.5个估算。
+    """
+    global _token_encoding
+    if _token_encoding is None:
+        try:
+            import tiktoken
+            _token_encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _token_encoding = False
+    if _token_encoding:
+        return len(_token_encoding.encode(text))
+
+    cjk = len(CJK_PATTERN.findall(text))
+    words = len(WORD_PATTERN.findall(text))
+    punctuation = len(PUNCTUATION_PATTERN.findall(text))
+    return cjk + math.ceil(words * 1.3 + punctuation * 0.5)
+
+
+def compress_transcript(text, token_budget, min_chars=8, max_chars=60):
+    """将字幕压缩到token预算以内
+
+    依次去除重复的识别结果、合并过短的片段，仍超出预算时将过长的句子切短，按字符二元组的TF-IDF
+    给句子打分，并优先保留开头和结尾的句子，最后按原顺序输出选中的句子。
+    """
+    # 去除重复行，比较时忽略标点和空白
+    lines = []
+    seen = set()
+    for line in text.splitlines():
+        line = line.strip()
+        key = PUNCTUATION_PATTERN.sub("", line).replace(" ", "")
+        if not key or key in seen:
+            continue
+        seen.add(key)
+        lines.append(line)
+
+    # 合并过短的片段
+    sentences = []
+    for line in lines:
+        if sentences and (len(sentences[-1]) < min_chars or len(line) < min_chars) \
+                and len(sentences[-1]) + len(line) < max_chars:
+            sentences[-1] = f"{sentences[-1]}，{line}"
+        else:
+            sentences.append(line)
+
+    tokens = [estimate_tokens(sentence) for sentence in sentences]
+    if sum(tokens) <= token_budget:
+        return "\n".join(sentences)
+
+    # 过长的句子（例如没有标点的识别结果）切成较短的片段再打分
+    pieces = []
+    for sentence in sentences:
+        if len(sentence) > max_chars * 2:
+            pieces.extend(sentence[i:i + max_chars] for i in range(0, len(sentence), max_chars))
+        else:
+            pieces.append(sentence)
+    if len(pieces) != len(sentences):
+        sentences = pieces
+        tokens = [estimate_tokens(sentence) for sentence in sentences]
+
+    # 以句子为文档计算字符二元组的TF-IDF
+    grams = [
+        [sentence[i:i + 2] for i in range(len(sentence) - 1)] or [sentence]
+        for sentence in sentences
+    ]
+    document_frequency = {}
+    for sentence_grams in grams:
+        for gram in set(sentence_grams):
+            document_frequency[gram] = document_frequency.get(gram, 0) + 1
+    total = len(sentences)
+    scores = []
+    for index, sentence_grams in enumerate(grams):
+        counts = {}
+        for gram in sentence_grams:
+            counts[gram] = counts.get(gram, 0) + 1
+        score = sum(
+            count / len(sentence_grams) * math.log(total / document_frequency[gram])
+            for gram, count in counts.items()
+        )
+        # 开头和结尾通常是视频的引入和总结
+        position = index / max(total - 1, 1)
+        if position < 0.1 or position > 0.9:
+            score *= 1.5
+        scores.append(score)
+
+    selected = set()
+    used = 0
+    for index in sorted(range(total), key=lambda i: scores[i], reverse=True):
+        if used + tokens[index] > token_budget:
+            continue
+        selected.add(index)
+        used += tokens[index]
+    if not selected:
+        # 预算比任何一句都小时截断得分最高的句子，保证提示词中有字幕内容
+        best = max(range(total), key=lambda i: scores[i])
+        return truncate_to_tokens(sentences[best], token_budget)
+    return "\n".join(sentences[index] for index in sorted(selected))
+
+
+def truncate_to_tokens(text, token_budget):
+    """截断文本使其不超过token预算"""
+    tokens = estimate_tokens(text)
+    if tokens <= token_budget:
+        return text
+    length = int(len(text) * token_budget / tokens)
+    while length > 0 and estimate_tokens(text[:length]) > token_budget:
+        length -= max(length // 10, 1)
+    return text[:max(length, 0)]
+
+
+class Metrics:
+    """运行指标：按阶段统计的耗时分布以及累计计数
+
+    耗时保留最近的样本用于计算分位数，同时维护累积直方图以便导出为Prometheus文本格式。
+    """
+
+    BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+    def __init__(self, max_samples=1000):
+        self.max_samples = max_samples
+        self.samples = {}
+        self.buckets = {}
+        self.counts = {}
+        self.sums = {}
+        self.counters = {}
+
+    def increment(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, stage, seconds):
+        if stage not in self.samples:
+            self.samples[stage] = deque(maxlen=self.max_samples)
+            self.buckets[stage] = [0] * len(self.BUCKETS)
+            self.counts[stage] = 0
+            self.sums[stage] = 0.0
+        self.samples[stage].append(seconds)
+        self.counts[stage] += 1
+        self.sums[stage] += seconds
+        for index, bound in enumerate(self.BUCKETS):
+            if seconds <= bound:
+                self.buckets[stage][index] += 1
+
+    @contextmanager
+    def time(self, stage):
+        """记录代码块的耗时"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def percentile(self, stage, q):
+        samples = sorted(self.samples.get(stage) or [])
+        if not samples:
+            return None
+        index = min(int(round(q / 100 * (len(samples) - 1))), len(samples) - 1)
+        return samples[index]
+
+    def render_prometheus(self, counters=None, gauges=None):
+        """导出为Prometheus文本格式，counters和gauges为额外需要导出的计数和当前值"""
+        lines = [
+            "# HELP bilisum_stage_seconds 各处理阶段的耗时",
+            "# TYPE bilisum_stage_seconds histogram",
+        ]
+        for stage in sorted(self.counts):
+            for bound, count in zip(self.BUCKETS, self.buckets[stage]):
+                lines.append(f'bilisum_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {count}')
+            lines.append(f'bilisum_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {self.counts[stage]}')
+            lines.append(f'bilisum_stage_seconds_sum{{stage="{stage}"}} {self.sums[stage]:.6f}')
+            lines.append(f'bilisum_stage_seconds_count{{stage="{stage}"}} {self.counts[stage]}')
+
+        all_counters = dict(self.counters)
+        all_counters.update(counters or {})
+        lines.append("# TYPE bilisum_events_total counter")
+        for name in sorted(all_counters):
+            lines.append(f'bilisum_events_total{{name="{name}"}} {all_counters[name]}')
+
+        lines.append("# TYPE bilisum_state gauge")
+        for name in sorted(gauges or {}):
+            lines.append(f'bilisum_state{{name="{name}"}} {gauges[name]}')
+        return "\n".join(lines) + "\n"
+
+
+class VideoInfoCache:
+    """视频信息缓存
+
+    按BV号缓存get_info中点评流程用到的字段，无效或已删除的视频也会缓存一段时间，
+    同一视频的并发查询只请求一次接口。
+    """
+
+    FIELDS = ("bvid", "aid", "cid", "title", "desc", "duration", "pages")
+
+    def __init__(self, ttl, negative_ttl, max_size=512):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self._pending = {}
+        self.stats = {"hits": 0, "misses": 0, "negative_hits": 0, "upstream_calls": 0}
+
+    async def get(self, v):
+        """获取视频信息，视频无效时抛出异常"""
+        bvid = v.get_bvid()
+        entry = self.entries.get(bvid)
+        if entry and entry[0] > time.time():
+            self.entries.move_to_end(bvid)
+            info, error = entry[1], entry[2]
+            if error is not None:
+                self.stats["negative_hits"] += 1
+                raise Exception(error)
+            self.stats["hits"] += 1
+            return info
+
+        self.stats["misses"] += 1
+        task = self._pending.get(bvid)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(v))
+            self._pending[bvid] = task
+            task.add_done_callback(lambda _: self._pending.pop(bvid, None))
+        return await asyncio.shield(task)
+
+    async def _fetch(self, v):
+        bvid = v.get_bvid()
+        self.stats["upstream_calls"] += 1
+        try:
+            raw = await v.get_info()
+        except ResponseCodeException as e:
+            # 视频不存在、已删除或不可见，短时间内不再请求
+            self._store(bvid, None, f"视频不可用: {str(e)}", self.negative_ttl)
+            raise Exception(f"视频不可用: {str(e)}")
+        info = {key: raw.get(key) for key in self.FIELDS}
+        info["pages"] = info["pages"] or []
+        self._store(bvid, info, None, self.ttl)
+        return info
+
+    def _store(self, bvid, info, error, ttl):
+        self.entries[bvid] = (time.time() + ttl, info, error)
+        self.entries.move_to_end(bvid)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+
+class AsyncRateLimiter:
+    """异步限流器，任意period秒内最多允许calls次调用
+
+    ratelimit包的装饰器只支持同步函数，超限时会阻塞线程，因此在协程中使用此限流器。
+    """
+
+    def __init__(self, calls, period):
+        self.calls = calls
+        self.period = period
+        self._timestamps = deque()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                while self._timestamps and now - self._timestamps[0] >= self.period:
+                    self._timestamps.popleft()
+                if len(self._timestamps) < self.calls:
+                    self._timestamps.append(now)
+                    return
+                await asyncio.sleep(self.period - (now - self._timestamps[0]))
+
+
+class QueueFullError(Exception):
+    """任务队列已满"""
+
+
+class ReviewJob:
+    """等待处理的点评任务"""
+
+    def __init__(self, session, func, args):
+        self.session = session
+        self.func = func
+        self.args = args
+        self.future = asyncio.get_running_loop().create_future()
+        self.enqueued_at = time.perf_counter()
+
+
+class ReviewScheduler:
+    """有界任务队列及后台工作协程
+
+    每个会话有独立的队列，工作协程在会话之间轮流取任务，
+    避免单个群聊一次发送大量链接时占满所有工作协程。
+    """
+
+    def __init__(self, workers, max_pending, metrics=None, on_complete=None):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.metrics = metrics
+        # 每个任务结束后调用，用于导出指标
+        self.on_complete = on_complete
+        self._queues = OrderedDict()
+        self._items = None
+        self._tasks = []
+        self.pending = 0
+        self.running = 0
+
+    def _start(self):
+        if self._tasks:
+            return
+        self._items = asyncio.Semaphore(0)
+        self._tasks = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+
+    def submit(self, session, func, *args):
+        """提交任务
+
+        Returns:
+            tuple: (任务结果的Future, 任务的排队位置，从1开始)
+        """
+        if self.pending >= self.max_pending:
+            raise QueueFullError(f"排队中的任务已达上限（{self.max_pending}）")
+        self._start()
+
+        job = ReviewJob(session, func, args)
+        queue = self._queues.setdefault(session, deque())
+        queue.append(job)
+        self.pending += 1
+        # 按会话轮流调度时，排在该任务前面的是每个会话中不晚于它的任务
+        index = len(queue)
+        position = sum(min(len(other), index) for other in self._queues.values())
+        self._items.release()
+        return job.future, position
+
+    def _next_job(self):
+        session, queue = next(iter(self._queues.items()))
+        job = queue.popleft()
+        if queue:
+            self._queues.move_to_end(session)
+        else:
+            del self._queues[session]
+        return job
+
+    async def _worker(self):
+        while True:
+            await self._items.acquire()
+            job = self._next_job()
+            self.pending -= 1
+            if self.metrics is not None:
+                self.metrics.observe("queue_wait", time.perf_counter() - job.enqueued_at)
+            if job.future.cancelled():
+                continue
+
+            self.running += 1
+            started = time.perf_counter()
+            try:
+                result = await job.func(*job.args)
+                if self.metrics is not None:
+                    self.metrics.observe("review_total", time.perf_counter() - started)
+                if not job.future.done():
+                    job.future.set_result(result)
+            except asyncio.CancelledError:
+                if not job.future.done():
+                    job.future.cancel()
+                raise
+            except Exception as e:
+                if not job.future.done():
+                    job.future.set_exception(e)
+            finally:
+                self.running -= 1
+                if self.on_complete is not None:
+                    self.on_complete()
+
+    async def close(self):
+        """停止工作协程，取消所有排队中的任务"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        for queue in self._queues.values():
+            for job in queue:
+                job.future.cancel()
+        self._queues.clear()
+        self.pending = 0
+
+
+class HistoryWriter:
+    """对话历史写入器
+
+    点评记录先追加到内存中，由后台任务按会话合并后写入，不阻塞回复；
+    写入时只保留最近max_messages条记录，写入开销不会随对话变长而持续增长。
+    """
+
+    def __init__(self, context, max_messages=100, flush_delay=2.0):
+        self.context = context
+        self.max_messages = max_messages
+        self.flush_delay = flush_delay
+        self.pending = {}
+        self._flush_task = None
+        self._flushing = False
+
+    def append(self, unified_msg_origin, prompt, reply):
+        """追加一轮对话，稍后批量写入"""
+        self.pending.setdefault(unified_msg_origin, []).extend([
+            {"role": "user", "content": prompt},
+            {"role": "assistant", "content": reply},
+        ])
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.ensure_future(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.flush_delay)
+        # 写入期间追加的记录不会再创建新的任务，由本任务继续写入
+        self._flushing = True
+        try:
+            while self.pending:
+                await self.flush()
+        finally:
+            self._flushing = False
+
+    async def flush(self):
+        """写入所有待写的对话记录"""
+        pending, self.pending = self.pending, {}
+        for unified_msg_origin, messages in pending.items():
+            try:
+                await self._write(unified_msg_origin, messages)
+            except Exception as e:
+                logger.warning(f"保存对话历史失败: {str(e)}")
+
+    async def _write(self, unified_msg_origin, messages):
+        conversation_manager = self.context.conversation_manager
+        # 获取当前对话ID
+        conversation_id = await conversation_manager.get_curr_conversation_id(unified_msg_origin)
+        if not conversation_id:
+            conversation_id = await conversation_manager.new_conversation(unified_msg_origin)
+
+        # 获取当前对话历史
+        conversation = await conversation_manager.get_conversation(unified_msg_origin, conversation_id)
+        history = json.loads(conversation.history) if conversation and conversation.history else []
+
+        # 追加新的对话记录，只保留最近的记录
+        history.extend(messages)
+        if self.max_messages > 0:
+            history = history[-self.max_messages:]
+
+        # 更新对话历史
+        await conversation_manager.update_conversation(
+            unified_msg_origin=unified_msg_origin,
+            conversation_id=conversation_id,
+            history=json.dumps(history)
+        )
+
+    async def close(self):
+        """取消延迟写入并立即写入剩余记录"""
+        if self._flush_task is not None and not self._flush_task.done():
+            if self._flushing:
+                # 正在写入时取消会丢失已取出的记录，等待其写完
+                await self._flush_task
+            else:
+                self._flush_task.cancel()
+        await self.flush()
+
+
+class Transcript:
+    """带时间轴的字幕，每段为(开始秒数, 结束秒数, 文本)"""
+
+    def __init__(self, segments, source="asr"):
+        # CC/AI字幕的一段内容可能有多行，合并为一行，保证dump()后每段仍占一行
+        self.segments = [
+            (float(start), float(end), LINE_BREAK_PATTERN.sub(" ", str(text)).strip())
+            for start, end, text in segments
+            if str(text).strip()
+        ]
+        # 字幕来源，例如asr、cache
+        self.source = source
+
+        # 识别失败而缺失的时间段
+        self.gaps = []
+
+    def has_data(self):
+        return len(self.segments) > 0
+
+    def chunks(self, max_chars):
+        """按时间顺序将字幕切分为若干块，每块文本不超过max_chars字"""
+        chunks = []
+        current = []
+        size = 0
+        for segment in self.segments:
+            if current and size + len(segment[2]) > max_chars:
+                chunks.append(current)
+                current = []
+                size = 0
+            current.append(segment)
+            size += len(segment[2]) + 1
+        if current:
+            chunks.append(current)
+        return chunks
+
+    def to_txt(self):
+        """纯文本字幕，用于构建提示词"""
+        return "\n".join(text for _, _, text in self.segments)
+
+    def dump(self):
+        """带时间轴的文本格式，每行为 `开始 -> 结束: 文本`"""
+        return "\n".join(
+            f"{round(start, 3)} -> {round(end, 3)}: {text}"
+            for start, end, text in self.segments
+        )
+
+    @classmethod
+    def load(cls, text, source="cache"):
+        """解析dump()生成的文本
+
+        旧版本缓存中多行字幕的后续行没有时间轴，拼接到上一段。
+        """
+        segments = []
+        for line in text.splitlines():
+            timing, sep, content = line.partition(": ")
+            try:
+                start, end = timing.split(" -> ", 1) if sep else ("", "")
+                segments.append((float(start), float(end), content))
+            except ValueError:
+                if segments and line.strip():
+                    start, end, previous = segments[-1]
+                    segments[-1] = (start, end, f"{previous} {line}")
+        return cls(segments, source)
+
+    @classmethod
+    def from_asr(cls, asr_data):
+        """从必剪识别结果构建字幕，必剪的时间单位为毫秒"""
+        return cls(
+            [(seg.start_time / 1000, seg.end_time / 1000, seg.transcript) for seg in asr_data.utterances],
+            source="asr"
+        )
+
+
+class TimeMap:
+    """裁剪静音后的音频时间与原视频时间的对应关系
+
+    spans为保留下来的原始时间段列表，按顺序拼接成裁剪后的音频。
+    """
+
+    def __init__(self, spans):
+        self.spans = [(float(start), float(end)) for start, end in spans]
+        self.offsets = []
+        position = 0.0
+        for start, end in self.spans:
+            self.offsets.append(position)
+            position += end - start
+        self.duration = position
+
+    def to_original(self, seconds):
+        """将裁剪后音频中的时间换算为原视频中的时间"""
+        if not self.spans:
+            return seconds
+        index = max(bisect.bisect_right(self.offsets, seconds) - 1, 0)
+        start, end = self.spans[index]
+        return min(start + seconds - self.offsets[index], end)
+
+    def remap(self, transcript):
+        """将字幕的时间轴换算回原视频"""
+        remapped = Transcript(
+            [(self.to_original(start), self.to_original(end), text) for start, end, text in transcript.segments],
+            source=transcript.source
+        )
+        remapped.gaps = [(self.to_original(start), self.to_original(end)) for start, end in transcript.gaps]
+        return remapped
+
+    def dump(self):
+        return json.dumps(self.spans)
+
+    @classmethod
+    def load(cls, text):
+        return cls(json.loads(text))
+
+
+class ASRBackend:
+    """语音识别后端接口"""
+
+    name = ""
+    # 识别用音频的格式及编码参数
+    audio_extension = "m4a"
+    audio_codec_args = ('-c:a', 'aac', '-b:a', '32k')
+
+    async def transcribe(self, audio_path):
+        """识别音频文件，返回Transcript"""
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class BcutASRBackend(ASRBackend):
+    """必剪语音识别，阻塞的网络请求在线程池中执行
+
+    轮询间隔按指数退避并加入随机抖动，超过timeout仍未完成时放弃。
+    """
+
+    name = "bcut"
+
+    def __init__(self, metrics, timeout=600, poll_interval=1, poll_max_interval=15.0, client_factory=BcutASR):
+        self.metrics = metrics
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.poll_max_interval = poll_max_interval
+        # 创建必剪客户端，测试时可替换为访问本地服务的客户端
+        self.client_factory = client_factory
+
+    async def _call(self, deadline, func, *args):
+        """在线程中执行阻塞的请求，到截止时间仍未返回时放弃等待
+
+        线程本身无法中止，但调用方会释放识别并发名额，不会被卡住的请求一直占用。
+        """
+        remaining = deadline - asyncio.get_running_loop().time()
+        try:
+            return await asyncio.wait_for(asyncio.to_thread(func, *args), max(remaining, 0))
+        except asyncio.TimeoutError:
+            raise Exception(f"字幕识别超时（{self.timeout:g}秒）")
+
+    async def transcribe(self, audio_path):
+        # 截止时间从上传开始计算，上传和创建任务也受timeout限制
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+        with self.metrics.time("asr_upload"):
+            asr = await self._call(deadline, self.client_factory, audio_path)
+            await self._call(deadline, asr.upload)
+        with self.metrics.time("asr_create_task"):
+            await self._call(deadline, asr.create_task)
+
+        with self.metrics.time("asr_recognize"):
+            interval = self.poll_interval
+            while True:
+                result = await self._call(deadline, asr.result)
+                if result.state == ResultStateEnum.COMPLETE:
+                    break
+                if result.state == ResultStateEnum.ERROR:
+                    raise Exception(f"必剪识别任务失败: {result.remark}")
+
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    raise Exception(f"字幕识别超时（{self.timeout:g}秒）")
+                await asyncio.sleep(min(interval * random.uniform(0.5, 1.5), remaining))
+                interval = min(interval * 2, self.poll_max_interval)
+
+        return Transcript.from_asr(result.parse())
+
+
+# 本地识别子进程中加载的模型，每个子进程只加载一次
+_local_asr_model = None
+
+
+def _local_transcribe(model_name, compute_type, language, audio_path):
+    """在子进程中使用faster-whisper识别音频"""
+    global _local_asr_model
+    if _local_asr_model is None:
+        from faster_whisper import WhisperModel
+        _local_asr_model = WhisperModel(model_name, device="cpu", compute_type=compute_type)
+    segments, _ = _local_asr_model.transcribe(audio_path, language=language or None, vad_filter=True)
+    return [(segment.start, segment.end, segment.text) for segment in segments]
+
+
+class LocalASRBackend(ASRBackend):
+    """使用faster-whisper在本地CPU上识别
+
+    每个并发名额对应一个只有一个工作进程的进程池，任务超时时只结束并重建该名额的进程，
+    其他名额上正在运行的任务不受影响。
+    """
+
+    name = "local"
+    audio_extension = "wav"
+    audio_codec_args = ('-c:a', 'pcm_s16le')
+
+    def __init__(self, metrics, model="small", workers=1, language="zh", compute_type="int8", timeout=600):
+        if importlib.util.find_spec("faster_whisper") is None:
+            raise Exception("未安装faster-whisper，无法使用本地语音识别")
+        self.metrics = metrics
+        self.model = model
+        self.language = language
+        self.compute_type = compute_type
+        self.timeout = timeout
+        self.executors = [ProcessPoolExecutor(max_workers=1) for _ in range(max(workers, 1))]
+        # 各进程池中工作进程的PID，首次使用时获取
+        self.worker_pids = [None] * len(self.executors)
+        self._idle_slots = None
+
+    @staticmethod
+    def _shutdown_executor(executor, pid):
+        """关闭进程池并结束其工作进程
+
+        已经开始运行的识别任务无法通过取消Future停止，只能结束子进程。
+        """
+        executor.shutdown(wait=False, cancel_futures=True)
+        if pid is not None:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except OSError:
+                # 进程已经退出
+                pass
+
+    def _recycle_slot(self, slot):
+        """结束并重建一个名额的进程池"""
+        executor, pid = self.executors[slot], self.worker_pids[slot]
+        self.executors[slot] = ProcessPoolExecutor(max_workers=1)
+        self.worker_pids[slot] = None
+        self.metrics.increment("asr_local_recycled")
+        self._shutdown_executor(executor, pid)
+
+    async def transcribe(self, audio_path):
+        loop = asyncio.get_running_loop()
+        if self._idle_slots is None:
+            self._idle_slots = asyncio.Queue()
+            for slot in range(len(self.executors)):
+                self._idle_slots.put_nowait(slot)
+
+        with self.metrics.time("asr_local"):
+            slot = await self._idle_slots.get()
+            try:
+                executor = self.executors[slot]
+                if self.worker_pids[slot] is None:
+                    self.worker_pids[slot] = await loop.run_in_executor(executor, os.getpid)
+                segments = await asyncio.wait_for(
+                    loop.run_in_executor(
+                        executor, _local_transcribe,
+                        self.model, self.compute_type, self.language, audio_path
+                    ),
+                    self.timeout
+                )
+            except asyncio.TimeoutError:
+                # 超时的任务会继续占用工作进程，之后分到该名额的任务都要排在它后面
+                self._recycle_slot(slot)
+                raise Exception(f"字幕识别超时（{self.timeout:g}秒）")
+            except BrokenProcessPool:
+                # 工作进程异常退出，例如内存不足
+                self._recycle_slot(slot)
+                raise Exception("本地语音识别进程已退出，请重试")
+            finally:
+                self._idle_slots.put_nowait(slot)
+        return Transcript(segments, source="asr")
+
+    async def close(self):
+        for executor, pid in zip(self.executors, self.worker_pids):
+            self._shutdown_executor(executor, pid)
+
+
+class FakeASRBackend(ASRBackend):
+    """离线测试用的识别后端，根据音频内容生成确定的字幕，不访问网络"""
+
+    name = "fake"
+
+    def __init__(self, metrics, delay=0.0, seconds_per_mb=0.0, bytes_per_segment=16000):
+        self.metrics = metrics
+        self.delay = delay
+        # 每MB音频额外的耗时，模拟上传和识别时间随音频大小增长
+        self.seconds_per_mb = seconds_per_mb
+        self.bytes_per_segment = bytes_per_segment
+
+    async def transcribe(self, audio_path):
+        with self.metrics.time("asr_fake"):
+            size = os.path.getsize(audio_path)
+            with open(audio_path, "rb") as f:
+                digest = hashlib.md5(f.read(65536)).hexdigest()
+            delay = self.delay + size / (1024 * 1024) * self.seconds_per_mb
+            if delay:
+                await asyncio.sleep(delay)
+        count = min(max(size // self.bytes_per_segment, 1), 500)
+        return Transcript(
+            [(index * 5, index * 5 + 4.5, f"第{index + 1}段语音内容 {digest[:8]}") for index in range(count)],
+            source="asr"
+        )
+
+
+def create_asr_backend(name, config, metrics):
+    """根据配置创建语音识别后端"""
+    timeout = float(config.get("asr_timeout", 600))
+    if name == "local":
+        return LocalASRBackend(
+            metrics,
+            model=config.get("local_asr_model", "small"),
+            workers=max(int(config.get("local_asr_workers", 1)), 1),
+            language=config.get("local_asr_language", "zh"),
+            timeout=timeout
+        )
+    if name == "fake":
+        return FakeASRBackend(
+            metrics,
+            delay=float(config.get("fake_asr_delay", 0)),
+            seconds_per_mb=float(config.get("fake_asr_seconds_per_mb", 0))
+        )
+    return BcutASRBackend(
+        metrics,
+        timeout=timeout,
+        poll_interval=max(float(config.get("asr_poll_interval", 1)), 0.1)
+    )
+
+
+class TranscriptCache:
+    """字幕缓存
+
+    用SQLite索引 BVID+cid 对应的字幕文件及下载的媒体文件，字幕和媒体分别有各自的TTL，
+    总占用超过磁盘预算时按最近最少使用的顺序淘汰。
+    """
+
+    def __init__(self, db_path, subtitle_dir, transcript_ttl, media_ttl, max_bytes):
+        self.subtitle_dir = subtitle_dir
+        self.transcript_ttl = transcript_ttl
+        self.media_ttl = media_ttl
+        self.max_bytes = max_bytes
+        self.stats = {"hits": 0, "misses": 0, "expired": 0, "evicted": 0}
+
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS transcripts (
+                bvid TEXT NOT NULL,
+                cid INTEGER NOT NULL,
+                path TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                source TEXT,
+                title TEXT,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (bvid, cid)
+            );
+            CREATE TABLE IF NOT EXISTS media (
+                path TEXT PRIMARY KEY,
+                bvid TEXT NOT NULL,
+                cid INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            );
+        """)
+        self.conn.commit()
+        self.purge_expired()
+
+    @staticmethod
+    def _remove_file(path):
+        if path and os.path.exists(path):
+            os.remove(path)
+
+    def get(self, bvid, cid):
+        """读取缓存的字幕，未命中或已过期时返回None"""
+        row = self.conn.execute(
+            "SELECT path, created_at FROM transcripts WHERE bvid = ? AND cid = ?", (bvid, cid)
+        ).fetchone()
+        if row is None:
+            self.stats["misses"] += 1
+            return None
+
+        path, created_at = row
+        if time.time() - created_at > self.transcript_ttl or not os.path.exists(path):
+            self.stats["expired"] += 1
+            self.stats["misses"] += 1
+            self._delete_transcript(bvid, cid, path)
+            return None
+
+        with open(path, "r", encoding="utf-8") as f:
+            transcript = Transcript.load(f.read())
+        self.conn.execute(
+            "UPDATE transcripts SET accessed_at = ?, hits = hits + 1 WHERE bvid = ? AND cid = ?",
+            (time.time(), bvid, cid)
+        )
+        self.conn.commit()
+        self.stats["hits"] += 1
+        return transcript
+
+    def contains(self, bvid, cid):
+        """检查字幕是否已缓存且未过期，不计入命中统计"""
+        row = self.conn.execute(
+            "SELECT path, created_at FROM transcripts WHERE bvid = ? AND cid = ?", (bvid, cid)
+        ).fetchone()
+        return row is not None and time.time() - row[1] <= self.transcript_ttl and os.path.exists(row[0])
+
+    def path_for(self, bvid, cid):
+        return os.path.join(self.subtitle_dir, f"{bvid}_{cid}_subtitle.txt")
+
+    def put(self, bvid, cid, transcript, title=None):
+        """保存字幕并删除对应的媒体文件，返回字幕文件路径"""
+        path = self.path_for(bvid, cid)
+        temp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(transcript.dump())
+        os.replace(temp_path, path)
+
+        now = time.time()
+        self.conn.execute(
+            "INSERT OR REPLACE INTO transcripts (bvid, cid, path, size, source, title, created_at, accessed_at, hits) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0)",
+            (bvid, cid, path, os.path.getsize(path), transcript.source, title, now, now)
+        )
+        # 字幕已保存，下载的媒体文件不再需要
+        for (media_path,) in self.conn.execute(
+            "SELECT path FROM media WHERE bvid = ? AND cid = ?", (bvid, cid)
+        ).fetchall():
+            self._remove_file(media_path)
+        self.conn.execute("DELETE FROM media WHERE bvid = ? AND cid = ?", (bvid, cid))
+        self.conn.commit()
+        self.evict()
+        return path
+
+    def track_media(self, path, bvid, cid):
+        """登记下载或转码得到的媒体文件，使其受TTL和磁盘预算管理"""
+        now = time.time()
+        self.conn.execute(
+            "INSERT OR REPLACE INTO media (path, bvid, cid, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (path, bvid, cid, os.path.getsize(path), now, now)
+        )
+        self.conn.commit()
+        self.evict()
+
+    def has_media(self, path):
+        """检查媒体文件是否可以复用，过期的文件会被删除"""
+        row = self.conn.execute("SELECT created_at FROM media WHERE path = ?", (path,)).fetchone()
+        if row is None or time.time() - row[0] > self.media_ttl or not os.path.exists(path):
+            self._remove_file(path)
+            self.conn.execute("DELETE FROM media WHERE path = ?", (path,))
+            self.conn.commit()
+            return False
+        self.conn.execute("UPDATE media SET accessed_at = ? WHERE path = ?", (time.time(), path))
+        self.conn.commit()
+        return True
+
+    def _delete_transcript(self, bvid, cid, path):
+        self._remove_file(path)
+        self.conn.execute("DELETE FROM transcripts WHERE bvid = ? AND cid = ?", (bvid, cid))
+        self.conn.commit()
+
+    def purge_expired(self):
+        """删除超过TTL的字幕和媒体文件"""
+        now = time.time()
+        for bvid, cid, path in self.conn.execute(
+            "SELECT bvid, cid, path FROM transcripts WHERE created_at < ?", (now - self.transcript_ttl,)
+        ).fetchall():
+            self._delete_transcript(bvid, cid, path)
+            self.stats["expired"] += 1
+        for (path,) in self.conn.execute(
+            "SELECT path FROM media WHERE created_at < ?", (now - self.media_ttl,)
+        ).fetchall():
+            self._remove_file(path)
+            self.conn.execute("DELETE FROM media WHERE path = ?", (path,))
+        self.conn.commit()
+
+    def total_size(self):
+        transcripts = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM transcripts").fetchone()[0]
+        media = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM media").fetchone()[0]
+        return transcripts + media
+
+    def evict(self):
+        """按最近最少使用的顺序淘汰，直到总占用不超过磁盘预算"""
+        total = self.total_size()
+        if total <= self.max_bytes:
+            return
+        entries = self.conn.execute("""
+            SELECT accessed_at, 'media', path, bvid, cid, size FROM media
+            UNION ALL
+            SELECT accessed_at, 'transcript', path, bvid, cid, size FROM transcripts
+            ORDER BY accessed_at
+        """).fetchall()
+        for _, kind, path, bvid, cid, size in entries:
+            if total <= self.max_bytes:
+                break
+            if kind == "media":
+                self._remove_file(path)
+                self.conn.execute("DELETE FROM media WHERE path = ?", (path,))
+            else:
+                self._delete_transcript(bvid, cid, path)
+            total -= size
+            self.stats["evicted"] += 1
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
 
 @register("bilisum", "victical", "B站视频点评插件", "0.07", "https://github.com/victical/astrbot_plugin_bilisum")
 class BiliSumPlugin(Star):
@@ -56,17 +1139,146 @@ class BiliSumPlugin(Star):
         os.makedirs(self.video_dir, exist_ok=True)
         os.makedirs(self.audio_dir, exist_ok=True)
 
+        # 清理上次运行残留的临时文件
+        for name in os.listdir(self.temp_dir):
+            path = os.path.join(self.temp_dir, name)
+            if os.path.isfile(path):
+                os.remove(path)
+
         # 硬编码提示词模板
         self.prompt_template = "请以B站网友的视角，用轻松活泼的语气对视频进行简短点评，控制在50字以内。\n\n视频标题：{title}\n视频简介：{desc}\n视频内容：{content}"
         
+        if not isinstance(config, dict):
+            config = {}
+
         # 从配置中加载系统提示词
-        if isinstance(config, dict):
-            self.system_prompt = config.get("system_prompt", "你是一个B站资深用户，请用第一人称'我'来点评，就像在评论区留言一样。")
-        else:
-            self.system_prompt = "你是一个B站资深用户，请用第一人称'我'来点评，就像在评论区留言一样。"
+        self.system_prompt = config.get("system_prompt", "你是一个B站资深用户，请用第一人称'我'来点评，就像在评论区留言一样。")
         
-        # 硬编码视频时长限制（12分钟）
-        self.max_duration = 720
+        # 视频时长限制（秒）
+        self.max_duration = max(int(config.get("max_duration", 3600)), 60)
+
+        # 长视频的音频按该时长切分后并行识别
+        self.asr_segment_seconds = max(int(config.get("asr_segment_seconds", 600)), 60)
+
+        # 字幕超过该字数时先分段总结，再根据各段总结生成点评
+        self.summary_chunk_chars = max(int(config.get("summary_chunk_chars", 6000)), 500)
+        self.summary_semaphore = asyncio.Semaphore(max(int(config.get("summary_max_concurrency", 3)), 1))
+
+        # 写入提示词的字幕token上限
+        self.prompt_token_budget = max(int(config.get("prompt_token_budget", 3000)), 100)
+
+        # 流式下载的分块大小（KB），决定单个下载任务的内存上限
+        self.download_chunk_size = max(int(config.get("download_chunk_kb", 256)), 16) * 1024
+
+        # B站登录凭据，部分视频的AI字幕需要登录后才能获取
+        sessdata = config.get("bili_sessdata", "")
+        self.credential = Credential(sessdata=sessdata) if sessdata else None
+
+        # 优先使用视频自带的CC/AI字幕，没有时才下载音频识别
+        self.prefer_native_subtitle = bool(config.get("prefer_native_subtitle", True))
+        # 各级字幕来源的命中次数
+        self.tier_stats = {"cache": 0, "native": 0, "asr": 0}
+
+        # 语音识别后端及并发数
+        self.metrics = Metrics()
+        self.asr_semaphore = asyncio.Semaphore(max(int(config.get("asr_max_concurrency", 2)), 1))
+        backend_name = config.get("asr_backend", "bcut")
+        try:
+            self.asr_backend = create_asr_backend(backend_name, config, self.metrics)
+        except Exception as e:
+            logger.error(f"创建语音识别后端{backend_name}失败，改用必剪: {str(e)}")
+            self.asr_backend = create_asr_backend("bcut", config, self.metrics)
+
+        # 识别用音频的配置：speech为16kHz单声道低码率，original为原先的44.1kHz双声道192k
+        self.asr_audio_profile = "original" if config.get("asr_audio_profile") == "original" else "speech"
+        # 识别前裁剪静音片段
+        self.trim_silence = bool(config.get("trim_silence", False))
+        self.silence_threshold_db = float(config.get("silence_threshold_db", -35))
+        self.silence_min_seconds = max(float(config.get("silence_min_seconds", 1.0)), 0.3)
+
+        # 只下载DASH音频流用于语音识别，不可用时回退到MP4
+        self.audio_only = bool(config.get("audio_only", True))
+
+        # 插件内所有B站API和CDN请求共用一个长连接客户端
+        self.http_max_retries = max(int(config.get("http_max_retries", 3)), 0)
+        self.http_per_host_limit = max(int(config.get("http_per_host_limit", 4)), 1)
+        self.http_client = create_http_client(
+            timeout=float(config.get("http_timeout", 30)),
+            connect_timeout=float(config.get("http_connect_timeout", 10)),
+            max_connections=max(int(config.get("http_max_connections", 20)), 1)
+        )
+        self._host_semaphores = {}
+
+        # 字幕缓存
+        self.cache = TranscriptCache(
+            os.path.join(self.data_dir, "cache.db"),
+            self.subtitle_dir,
+            transcript_ttl=float(config.get("transcript_ttl_days", 30)) * 86400,
+            media_ttl=float(config.get("media_ttl_hours", 24)) * 3600,
+            max_bytes=float(config.get("cache_max_mb", 1024)) * 1024 * 1024
+        )
+
+        # b23.tv短链接的解析结果缓存
+        self._short_link_cache = OrderedDict()
+        self.short_link_ttl = 86400
+        self.short_link_cache_size = 512
+
+        # 视频信息缓存，同一视频在有效期内只请求一次接口
+        self.info_cache = VideoInfoCache(
+            ttl=float(config.get("video_info_ttl", 600)),
+            negative_ttl=float(config.get("video_info_negative_ttl", 120))
+        )
+
+        # 一条消息中最多点评的视频数，以及多个视频时合并回复还是分别回复
+        self.batch_max_videos = max(int(config.get("batch_max_videos", 5)), 1)
+        self.batch_reply_mode = config.get("batch_reply_mode", "combined")
+
+        # 对话历史写入器
+        self.history_writer = HistoryWriter(
+            context,
+            max_messages=max(int(config.get("history_max_messages", 100)), 0)
+        )
+
+        # 点评任务队列
+        self.scheduler = ReviewScheduler(
+            workers=max(int(config.get("review_workers", 2)), 1),
+            max_pending=max(int(config.get("review_queue_size", 20)), 1),
+            metrics=self.metrics,
+            on_complete=self.dump_metrics
+        )
+        self.metrics_path = os.path.join(self.data_dir, "metrics.prom")
+
+        # 正在处理中的字幕任务，同一视频的并发请求共享一个任务
+        self._inflight = {}
+
+        # 预先识别关注的UP主新投稿，用户请求时直接使用缓存的字幕
+        self.prewarm_mids = [str(mid).strip() for mid in config.get("prewarm_mids", []) or [] if str(mid).strip().isdigit()]
+        self.prewarm_interval = max(float(config.get("prewarm_interval_minutes", 30)), 1) * 60
+        self.prewarm_per_mid = max(int(config.get("prewarm_videos_per_mid", 3)), 1)
+        self.prewarm_limiter = AsyncRateLimiter(max(int(config.get("prewarm_requests_per_minute", 10)), 1), 60)
+        self.prewarm_stats = {"polls": 0, "videos": 0, "failed": 0, "skipped": 0}
+        self._prewarm_task = None
+        self._ensure_prewarm()
+
+        # FFmpeg路径及并发限制，避免大量转码进程同时抢占CPU
+        self.ffmpeg_path = find_ffmpeg(config.get("ffmpeg_path", ""))
+        self.ffmpeg_timeout = float(config.get("ffmpeg_timeout", 300))
+        self.ffmpeg_semaphore = asyncio.Semaphore(max(int(config.get("ffmpeg_max_workers", 2)), 1))
+        # FFmpeg队列指标
+        self.ffmpeg_stats = {"waiting": 0, "running": 0, "max_waiting": 0, "completed": 0, "failed": 0}
+
+    async def terminate(self):
+        """插件卸载时取消进行中的任务并关闭连接池"""
+        if self._prewarm_task is not None:
+            self._prewarm_task.cancel()
+            await asyncio.gather(self._prewarm_task, return_exceptions=True)
+        await self.scheduler.close()
+        await self.history_writer.close()
+        await self.asr_backend.close()
+        for task in list(self._inflight.values()):
+            task.cancel()
+        await self.http_client.aclose()
+        self.cache.close()
 
     def get_config(self):
         """获取当前配置"""
@@ -74,324 +1286,950 @@ class BiliSumPlugin(Star):
             "system_prompt": self.system_prompt
         }
 
-    async def download_stream(self, url, headers, max_retries=3):
-        """发送B站API请求"""
-        headers = {
-            "referer": "https://www.bilibili.com/",
-            "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36"
-        }
+    @staticmethod
+    def _parse_total_size(response, offset):
+        """根据响应头计算文件总大小，无法确定时返回None"""
+        content_range = response.headers.get("content-range")
+        if response.status_code == 206 and content_range and "/" in content_range:
+            total = content_range.rsplit("/", 1)[1].strip()
+            return int(total) if total.isdigit() else None
+        content_length = response.headers.get("content-length")
+        if content_length and content_length.isdigit():
+            return offset + int(content_length)
+        return None
+
+    def _host_slot(self, url):
+        """获取目标主机的并发槽位，限制对单个主机的同时连接数"""
+        host = httpx.URL(url).host
+        semaphore = self._host_semaphores.get(host)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.http_per_host_limit)
+            self._host_semaphores[host] = semaphore
+        return semaphore
+
+    async def api_request(self, url, return_json=True):
+        """通过共享连接池发送B站API请求"""
+        async with self._host_slot(url):
+            return await bili_request(url, return_json, self.http_client, self.http_max_retries)
+
+    async def download_stream(self, url, headers, file_path, max_retries=None):
+        """流式下载文件到磁盘，连接中断时使用Range断点续传
+
+        Returns:
+            int: 写入磁盘的总字节数
+        """
+        if max_retries is None:
+            max_retries = self.http_max_retries
+        request_headers = DEFAULT_HEADERS.copy()
+        request_headers.update(headers or {})
+
+        started = time.perf_counter()
+        total_size = None
+        last_error = None
+        for attempt in range(max_retries + 1):
+            downloaded = os.path.getsize(file_path) if os.path.exists(file_path) else 0
+            current_headers = request_headers.copy()
+            if downloaded:
+                current_headers["Range"] = f"bytes={downloaded}-"
+                logger.info(f"从 {downloaded} 字节处继续下载 (第{attempt + 1}次尝试)")
+
+            try:
+                async with self._host_slot(url):
+                    async with self.http_client.stream("GET", url, headers=current_headers) as response:
+                        if downloaded and response.status_code == 416 and downloaded == total_size:
+                            # 文件已经下载完整
+                            self.metrics.observe("download", time.perf_counter() - started)
+                            return downloaded
+                        response.raise_for_status()
 
+                        if downloaded and response.status_code != 206:
+                            # 服务器不支持Range，重新下载
+                            logger.warning("服务器不支持断点续传，重新下载")
+                            downloaded = 0
+
+                        size = self._parse_total_size(response, downloaded)
+                        if size is not None:
+                            total_size = size
+
+                        # 按块写入磁盘，单次下载的内存占用不超过一个块
+                        with open(file_path, "ab" if downloaded else "wb") as f:
+                            async for chunk in response.aiter_bytes(self.download_chunk_size):
+                                f.write(chunk)
+                                downloaded += len(chunk)
+                                self.metrics.increment("download_bytes", len(chunk))
+
+                if total_size is not None and downloaded != total_size:
+                    if downloaded > total_size:
+                        # 内容超出Content-Length，文件已不可信
+                        os.remove(file_path)
+                    raise Exception(f"下载不完整: {downloaded}/{total_size} 字节")
+                self.metrics.observe("download", time.perf_counter() - started)
+                return downloaded
+            except Exception as e:
+                if isinstance(e, httpx.HTTPStatusError) and e.response.status_code < 500:
+                    # 链接过期（403）或不存在（404），重试没有意义
+                    raise Exception(f"下载失败: {str(e)}")
+                last_error = e
+                logger.warning(f"下载中断 (第{attempt + 1}次尝试): {str(e)}")
+                if attempt < max_retries:
+                    await asyncio.sleep(min(2 ** attempt, 10))
+
+        raise Exception(f"下载失败，已重试{max_retries}次: {str(last_error)}")
+
+    async def run_ffmpeg(self, args, timeout=None, loglevel='error'):
+        """在受限的进程池中异步执行FFmpeg，超时或被取消时结束子进程
+
+        Returns:
+            str: FFmpeg的日志输出
+        """
+        if not self.ffmpeg_path:
+            raise Exception("未找到FFmpeg，请安装FFmpeg或在配置中指定ffmpeg_path")
+        timeout = timeout or self.ffmpeg_timeout
+
+        stats = self.ffmpeg_stats
+        stats["waiting"] += 1
+        stats["max_waiting"] = max(stats["max_waiting"], stats["waiting"])
+        if stats["waiting"] > 1 or stats["running"]:
+            logger.info(f"FFmpeg任务排队中: 等待 {stats['waiting']}，运行中 {stats['running']}")
+        acquired = False
+        queued_at = time.perf_counter()
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.get(url, headers=headers)
-                response.raise_for_status()
-                return response
-        except (httpx.HTTPError, httpx.RequestError) as e:
+            async with self.ffmpeg_semaphore:
+                acquired = True
+                stats["waiting"] -= 1
+                stats["running"] += 1
+                started = time.perf_counter()
+                self.metrics.observe("ffmpeg_wait", started - queued_at)
+                process = await asyncio.create_subprocess_exec(
+                    self.ffmpeg_path, '-y', '-nostats', '-loglevel', loglevel, *args,
+                    stdin=asyncio.subprocess.DEVNULL,
+                    stdout=asyncio.subprocess.DEVNULL,
+                    stderr=asyncio.subprocess.PIPE
+                )
+                try:
+                    _, stderr = await asyncio.wait_for(process.communicate(), timeout)
+                except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+                    # 超时或任务取消时结束FFmpeg子进程
+                    if process.returncode is None:
+                        try:
+                            process.kill()
+                        except ProcessLookupError:
+                            pass
+                        await process.wait()
+                    if isinstance(e, asyncio.TimeoutError):
+                        raise Exception(f"FFmpeg执行超时（{timeout}秒）")
+                    raise
+
+                self.metrics.observe("ffmpeg", time.perf_counter() - started)
+                if process.returncode != 0:
+                    raise Exception(f"FFmpeg执行失败 (返回码: {process.returncode}): {stderr.decode(errors='ignore').strip()}")
+            stats["completed"] += 1
+            return stderr.decode(errors='ignore')
+        except BaseException:
+            stats["failed"] += 1
+            raise
+        finally:
+            if acquired:
+                stats["running"] -= 1
+            else:
+                stats["waiting"] -= 1
+
+    async def _resolve_short_link(self, url):
+        """解析b23.tv短链接的跳转目标，结果会缓存一段时间"""
+        if not url.startswith("http"):
+            url = "https://" + url
+        cached = self._short_link_cache.get(url)
+        if cached and cached[0] > time.time():
+            self._short_link_cache.move_to_end(url)
+            return cached[1]
+
+        target = None
+        try:
+            async with self._host_slot(url):
+                response = await self.http_client.get(url, follow_redirects=False)
+            target = response.headers.get("location")
+        except httpx.HTTPError as e:
+            logger.warning(f"解析短链接失败: {url}: {str(e)}")
             return None
 
-    async def get_best_subtitle(self, v, cid):
+        self._short_link_cache[url] = (time.time() + self.short_link_ttl, target)
+        self._short_link_cache.move_to_end(url)
+        while len(self._short_link_cache) > self.short_link_cache_size:
+            self._short_link_cache.popitem(last=False)
+        return target
+
+    @staticmethod
+    def _parse_video_refs(text):
+        """按出现顺序提取文本中的视频及链接中的分P序号
+
+        Returns:
+            list: (BV号, 分P序号)列表
+        """
+        refs = []
+        for match in VIDEO_REF_PATTERN.finditer(text):
+            if match.group(1):
+                bvid = match.group(1)
+            else:
+                bvid = video.Video(aid=int(match.group(2))).get_bvid()
+            page_match = PAGE_PATTERN.match(text, match.end())
+            page = int(page_match.group(1)) if page_match else 1
+            refs.append((bvid, max(page, 1)))
+        return refs
+
+    async def find_videos(self, text):
+        """从消息中识别所有B站视频，支持BV号、av号、视频链接（含?p=分P）和b23.tv短链接
+
+        Returns:
+            list: 去重后的(BV号, 分P序号)列表，消息中没有视频时为空列表
+        """
+        if not text:
+            return []
+
+        refs = self._parse_video_refs(text)
+        for short_url in SHORT_LINK_PATTERN.findall(text):
+            target = await self._resolve_short_link(short_url)
+            if target:
+                refs.extend(self._parse_video_refs(target))
+
+        videos = []
+        for ref in refs:
+            if ref not in videos:
+                videos.append(ref)
+        return videos
+
+    def _temp_path(self, name):
+        """生成唯一的临时文件路径，避免并发任务写同一个文件"""
+        return os.path.join(self.temp_dir, f"{uuid.uuid4().hex[:12]}_{name}")
+
+    @staticmethod
+    def _cdn_headers():
+        """下载B站CDN资源所需的请求头"""
+        headers = HEADERS.copy()
+        headers.update({
+            'Referer': 'https://www.bilibili.com'
+        })
+        return headers
+
+    async def _download_video(self, bvid, aid, cid):
+        """下载360p MP4视频，返回本地视频文件路径"""
+        # 检查视频文件是否已存在
+        video_download_path = os.path.join(self.video_dir, f"{bvid}_{cid}.mp4")
+        if self.cache.has_media(video_download_path):
+            logger.info(f"视频文件已存在: {video_download_path}")
+            # 使用已存在的视频文件
+            return video_download_path
+
+        # 使用bili_get的方法获取视频下载地址
+        api_url = f"https://api.bilibili.com/x/player/playurl?avid={aid}&cid={cid}&qn=16&type=mp4&platform=html5"
+        with self.metrics.time("playurl"):
+            data = await self.api_request(api_url)
+        
+        if data.get("code") != 0:
+            raise Exception(f"获取视频地址失败: {data.get('message')}")
+        
+        if not data.get("data", {}).get("durl"):
+            raise Exception("视频没有可用的下载地址")
+            
+        # 使用临时目录存放视频文件
+        video_path = self._temp_path(f"{bvid}_video.mp4")
+        
         try:
-            # 获取视频信息
-            info = await v.get_info()
-            aid = info['aid']
+            # 下载视频流
+            video_url = data["data"]["durl"][0]["url"]
+            logger.info(f"开始下载视频流 (360p): {video_url}")
+
+            # 流式下载视频到临时文件
+            file_size = await self.download_stream(video_url, self._cdn_headers(), video_path)
+            
+            # 检查下载的内容
+            if not file_size:
+                raise Exception("下载的视频内容为空")
             
-            # 检查视频文件是否已存在
-            video_download_path = os.path.join(self.data_dir, "videos", f"{v.get_bvid()}.mp4")
-            if os.path.exists(video_download_path):
-                logger.info(f"视频文件已存在: {video_download_path}")
-                # 使用已存在的视频文件
-                video_path = video_download_path
+            logger.info(f"视频流下载完成，文件大小: {file_size} 字节")
+
+            # 移动视频文件到下载目录
+            os.replace(video_path, video_download_path)
+            self.cache.track_media(video_download_path, bvid, cid)
+            logger.info(f"视频文件已保存到: {video_download_path}")
+            return video_download_path
+
+        except Exception as e:
+            logger.error(f"视频下载失败: {str(e)}")
+            if os.path.exists(video_path):
+                os.remove(video_path)
+            raise
+
+    async def _detect_speech_spans(self, source_path, duration):
+        """使用silencedetect找出静音区间，返回需要保留的时间段
+
+        静音占比很小时返回None，表示不需要裁剪。
+        """
+        output = await self.run_ffmpeg([
+            '-i', source_path,
+            '-vn',
+            '-af', f'silencedetect=noise={self.silence_threshold_db}dB:d={self.silence_min_seconds}',
+            '-f', 'null', '-'
+        ], loglevel='info')
+        starts = [float(value) for value in SILENCE_START_PATTERN.findall(output)]
+        ends = [float(value) for value in SILENCE_END_PATTERN.findall(output)]
+        if not starts:
+            return None
+
+        # 每段静音两端各保留一小段，避免切掉字词的开头和结尾
+        padding = 0.2
+        spans = []
+        position = 0.0
+
+        def keep(start, end):
+            # 静音短于两倍padding时相邻时间段会重叠，合并为一段，
+            # 否则TimeMap按各段长度累加会使还原的时间轴逐段偏移
+            if spans and start <= spans[-1][1]:
+                spans[-1] = (spans[-1][0], max(spans[-1][1], end))
+            elif end > start:
+                spans.append((start, end))
+
+        for index, silence_start in enumerate(starts):
+            keep(position, min(silence_start + padding, duration))
+            # 结尾的静音没有对应的silence_end
+            position = max(ends[index] - padding, position) if index < len(ends) else duration
+        if position < duration:
+            keep(position, duration)
+
+        kept = sum(end - start for start, end in spans)
+        if not spans or kept > duration * 0.95:
+            return None
+        logger.info(f"裁剪静音: {duration:.0f}秒 -> {kept:.0f}秒")
+        return spans
+
+    async def _extract_audio(self, source_path, audio_path, duration=0, remux=False):
+        """将视频或音频流转换为识别用的音频
+
+        speech配置下统一转为16kHz单声道的低码率音频，编码格式由识别后端决定；
+        开启静音裁剪时同时去掉静音片段，并保存时间对应关系用于还原字幕时间轴。
+
+        Args:
+            remux: 输入已经是纯音频流，original配置下只重新封装不重新编码
+
+        Returns:
+            TimeMap: 裁剪静音时的时间对应关系，未裁剪时为None
+        """
+        temp_audio_path = self._temp_path(os.path.basename(audio_path))
+        try:
+            logger.info("开始分离音频...")
+            
+            # 检查输入文件
+            if not os.path.exists(source_path):
+                raise Exception(f"输入视频文件不存在: {source_path}")
+
+            spans = None
+            if self.trim_silence and duration:
+                spans = await self._detect_speech_spans(source_path, duration)
+
+            args = ['-i', source_path, '-vn']  # 禁用视频
+            if spans:
+                select = "+".join(f"between(t,{start:.3f},{end:.3f})" for start, end in spans)
+                args += ['-af', f"aselect='{select}',asetpts=N/SR/TB"]
+            if self.asr_audio_profile == "speech":
+                args += ['-ac', '1', '-ar', '16000', *self.asr_backend.audio_codec_args]
+            elif remux and not spans:
+                args += ['-c:a', 'copy']
             else:
-                # 使用bili_get的方法获取视频下载地址
-                api_url = f"https://api.bilibili.com/x/player/playurl?avid={aid}&cid={cid}&qn=16&type=mp4&platform=html5"
-                data = await bili_request(api_url)
-                
-                if data.get("code") != 0:
-                    yield None, f"获取视频地址失败: {data.get('message')}"
-                    return
-                
-                if not data.get("data", {}).get("durl"):
-                    yield None, "视频没有可用的下载地址"
-                    return
-                    
-                # 使用临时目录存放视频和音频文件
-                video_path = os.path.join(self.temp_dir, f"{v.get_bvid()}_video.mp4")
-                
-                try:
-                    # 下载视频流
-                    video_url = data["data"]["durl"][0]["url"]
-                    logger.info(f"开始下载视频流 (360p): {video_url}")
-                    headers = HEADERS.copy()
-                    headers.update({
-                        'Referer': 'https://www.bilibili.com'
-                    })
-                    resp = await self.download_stream(video_url, headers)
-                    
-                    # 检查下载的内容
-                    if not resp or not resp.content:
-                        raise Exception("下载的视频内容为空")
-                    
-                    # 保存视频文件
-                    with open(video_path, 'wb') as f:
-                        f.write(resp.content)
-                    
-                    # 验证文件是否成功保存
-                    if not os.path.exists(video_path):
-                        raise Exception(f"视频文件保存失败: {video_path}")
-                    
-                    file_size = os.path.getsize(video_path)
-                    logger.info(f"视频流下载完成，文件大小: {file_size} 字节")
-
-                    # 移动视频文件到下载目录
-                    os.makedirs(os.path.dirname(video_download_path), exist_ok=True)
-                    import shutil
-                    shutil.move(video_path, video_download_path)
-                    logger.info(f"视频文件已保存到: {video_download_path}")
-                    video_path = video_download_path
+                args += [
+                    '-acodec', 'aac',  # 使用AAC编码
+                    '-ar', '44100',  # 设置采样率
+                    '-ac', '2',  # 设置声道数
+                    '-b:a', '192k',  # 设置比特率
+                ]
+            await self.run_ffmpeg(args + [temp_audio_path])
+            
+            # 验证输出文件
+            if not os.path.exists(temp_audio_path):
+                raise Exception(f"音频文件生成失败: {temp_audio_path}")
+            
+            # 移动音频文件到正式目录
+            os.replace(temp_audio_path, audio_path)
+            logger.info(f"音频文件已保存到: {audio_path}")
+
+            time_map = TimeMap(spans) if spans else None
+            map_path = f"{audio_path}.timemap.json"
+            if time_map:
+                with open(map_path, "w", encoding="utf-8") as f:
+                    f.write(time_map.dump())
+            elif os.path.exists(map_path):
+                os.remove(map_path)
+            return time_map
+            
+        except Exception as e:
+            logger.error(f"音频分离失败: {str(e)}")
+            if os.path.exists(temp_audio_path):
+                os.remove(temp_audio_path)
+            raise Exception(f"音频分离失败: {str(e)}")
+
+    async def _download_dash_audio(self, bvid, aid, cid, audio_path, duration=0):
+        """只下载DASH中码率最低的音频流并转换为识别用的音频
+
+        Returns:
+            tuple: (是否成功, 时间对应关系)，没有可用的DASH音频流时为(False, None)
+        """
+        api_url = f"https://api.bilibili.com/x/player/playurl?avid={aid}&cid={cid}&fnval=16&fnver=0&fourk=0"
+        with self.metrics.time("playurl"):
+            data = await self.api_request(api_url)
+        if data.get("code") != 0:
+            logger.warning(f"获取DASH地址失败: {data.get('message')}")
+            return False, None
+
+        audio_urls = select_dash_audio(data.get("data") or {})
+        if not audio_urls:
+            logger.info("视频未提供DASH音频流")
+            return False, None
 
+        temp_stream_path = self._temp_path(f"{bvid}_audio.m4s")
+        try:
+            # 主地址失败时依次尝试备用地址
+            for index, audio_url in enumerate(audio_urls):
+                if os.path.exists(temp_stream_path):
+                    os.remove(temp_stream_path)
+                try:
+                    logger.info(f"开始下载DASH音频流: {audio_url}")
+                    file_size = await self.download_stream(audio_url, self._cdn_headers(), temp_stream_path)
+                    break
                 except Exception as e:
-                    logger.error(f"视频下载失败: {str(e)}")
-                    if os.path.exists(video_path):
-                        os.remove(video_path)
-                    yield None, f"无法获取视频: {str(e)}"
-                    return
+                    if index == len(audio_urls) - 1:
+                        raise
+                    logger.warning(f"DASH音频下载失败，尝试备用地址: {str(e)}")
+
+            if not file_size:
+                raise Exception("下载的音频内容为空")
+            logger.info(f"DASH音频下载完成，文件大小: {file_size} 字节")
+
+            time_map = await self._extract_audio(temp_stream_path, audio_path, duration, remux=True)
+            return True, time_map
+        finally:
+            if os.path.exists(temp_stream_path):
+                os.remove(temp_stream_path)
+
+    async def get_best_subtitle(self, v, cid, info=None):
+        """获取视频字幕
+
+        同一视频的并发请求只执行一次下载和识别，其余请求等待同一个结果，
+        处理失败时所有等待者都会收到相同的错误信息。
+        """
+        key = f"{v.get_bvid()}:{cid}"
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._resolve_subtitle(v, cid, info))
+            self._inflight[key] = task
+
+            def _release(done_task):
+                if self._inflight.get(key) is done_task:
+                    del self._inflight[key]
+
+            task.add_done_callback(_release)
+        else:
+            logger.info(f"视频 {key} 正在处理中，等待已有任务的结果")
+
+        # 单个请求被取消时不影响其他等待同一结果的请求
+        subtitle, result = await asyncio.shield(task)
+        yield subtitle, result
+
+    async def _recognize(self, audio_path):
+        """使用配置的语音识别后端识别音频，同时进行的识别任务数受asr_max_concurrency限制"""
+        async with self.asr_semaphore:
+            return await self.asr_backend.transcribe(audio_path)
 
-            # 使用subprocess直接调用FFmpeg分离音频
+    async def _recognize_segmented(self, audio_path, duration):
+        """将长音频按时间切分后并行识别，再按各段的起始时间拼接字幕
+
+        单个分段识别失败时保留其余分段的结果，缺失的时间段记录在gaps中。
+        """
+        segment_seconds = self.asr_segment_seconds
+        count = math.ceil(duration / segment_seconds)
+        extension = os.path.splitext(audio_path)[1]
+        logger.info(f"音频时长{duration}秒，切分为{count}段并行识别")
+
+        async def recognize_segment(index):
+            offset = index * segment_seconds
+            segment_path = self._temp_path(f"segment{index}{extension}")
             try:
-                logger.info("开始分离音频...")
-                
-                # 检查输入文件
-                if not os.path.exists(video_path):
-                    raise Exception(f"输入视频文件不存在: {video_path}")
-                
-                # 检查音频文件是否已存在
-                audio_path = os.path.join(self.audio_dir, f"{v.get_bvid()}.m4a")
-                if os.path.exists(audio_path):
-                    logger.info(f"音频文件已存在: {audio_path}")
-                else:
-                    # 使用subprocess直接调用FFmpeg
-                    import subprocess
-                    
-                    # 使用确切的FFmpeg路径
-                    ffmpeg_path = '/root/.pyffmpeg/bin/ffmpeg'
-                    if not os.path.exists(ffmpeg_path):
-                        raise Exception(f"FFmpeg不存在于路径: {ffmpeg_path}")
-                    
-                    # 使用临时目录存放临时音频文件
-                    temp_audio_path = os.path.join(self.temp_dir, f"{v.get_bvid()}_audio.m4a")
-                    
-                    cmd = [
-                        ffmpeg_path,
-                        '-y',  # 覆盖已存在的文件
-                        '-i', video_path,
-                        '-vn',  # 禁用视频
-                        '-acodec', 'aac',  # 使用AAC编码
-                        '-ar', '44100',  # 设置采样率
-                        '-ac', '2',  # 设置声道数
-                        '-b:a', '192k',  # 设置比特率
-                        '-loglevel', 'error',  # 只显示错误信息
-                        temp_audio_path
-                    ]
-                    
-                    # 使用Popen来执行命令
-                    process = subprocess.Popen(
-                        cmd,
-                        stdout=subprocess.PIPE,
-                        stderr=subprocess.PIPE,
-                        universal_newlines=True
-                    )
-                    
-                    # 等待进程完成
-                    return_code = process.wait()
-                    
-                    if return_code != 0:
-                        _, stderr = process.communicate()
-                        raise Exception(f"FFmpeg执行失败 (返回码: {return_code}): {stderr}")
-                    
-                    # 验证输出文件
-                    if not os.path.exists(temp_audio_path):
-                        raise Exception(f"音频文件生成失败: {temp_audio_path}")
-                    
-                    # 移动音频文件到正式目录
-                    import shutil
-                    shutil.move(temp_audio_path, audio_path)
-                    logger.info(f"音频文件已保存到: {audio_path}")
-                
-                audio_size = os.path.getsize(audio_path)
-                logger.info(f"音频文件大小: {audio_size} 字节")
-                
-            except Exception as e:
-                logger.error(f"音频分离失败: {str(e)}")
-                if os.path.exists(temp_audio_path):
-                    os.remove(temp_audio_path)
-                raise Exception(f"音频分离失败: {str(e)}")
+                await self.run_ffmpeg([
+                    '-ss', str(offset),
+                    '-t', str(segment_seconds),
+                    '-i', audio_path,
+                    '-vn',
+                    '-c:a', 'copy',
+                    segment_path
+                ])
+                transcript = await self._recognize(segment_path)
+                return [(start + offset, end + offset, text) for start, end, text in transcript.segments]
+            finally:
+                if os.path.exists(segment_path):
+                    os.remove(segment_path)
 
-            # 使用必剪API识别字幕
-            logger.info("开始识别字幕")
-            asr = BcutASR(audio_path)
-            asr.upload()
-            asr.create_task()
+        results = await asyncio.gather(
+            *(recognize_segment(index) for index in range(count)),
+            return_exceptions=True
+        )
 
-            # 轮询检查结果
-            while True:
-                result = asr.result()
-                if result.state == ResultStateEnum.COMPLETE:
-                    break
-                await asyncio.sleep(1)
+        segments = []
+        gaps = []
+        errors = []
+        for index, result in enumerate(results):
+            if isinstance(result, BaseException):
+                start = index * segment_seconds
+                gaps.append((start, min(start + segment_seconds, duration)))
+                errors.append(result)
+                logger.warning(f"第{index + 1}段音频识别失败: {str(result)}")
+            else:
+                segments.extend(result)
+
+        if len(errors) == count:
+            raise errors[0]
+        transcript = Transcript(segments, source="asr")
+        transcript.gaps = gaps
+        return transcript
 
-            # 解析字幕内容
-            subtitle = result.parse()
+    async def _fetch_native_subtitle(self, v, cid):
+        """获取视频自带的CC字幕或AI字幕，没有可用字幕时返回None"""
+        try:
+            subtitle_info = await v.get_subtitle(cid)
+            track = select_subtitle_track((subtitle_info or {}).get("subtitles"))
+            if track is None:
+                return None
+
+            subtitle_url = track["subtitle_url"]
+            if subtitle_url.startswith("//"):
+                subtitle_url = "https:" + subtitle_url
+            data = await self.api_request(subtitle_url)
+            body = data.get("body") or []
+            transcript = Transcript(
+                [(item.get("from", 0), item.get("to", 0), item.get("content", "")) for item in body],
+                source="native"
+            )
+            if not transcript.has_data():
+                return None
+            logger.info(f"使用视频自带字幕: {track.get('lan_doc') or track.get('lan')}")
+            return transcript
+        except Exception as e:
+            logger.warning(f"获取视频自带字幕失败: {str(e)}")
+            return None
+
+    async def _resolve_subtitle(self, v, cid, info=None):
+        """按缓存、视频自带字幕、语音识别的顺序获取字幕
+
+        Returns:
+            tuple: (字幕, 字幕路径)，失败时为(None, 错误信息)
+        """
+        try:
+            bvid = v.get_bvid()
+
+            # 第一级：缓存的字幕
+            cached = self.cache.get(bvid, cid)
+            if cached is not None and cached.has_data():
+                logger.info(f"命中字幕缓存: {bvid} (cid={cid})")
+                self.tier_stats["cache"] += 1
+                return cached, self.cache.path_for(bvid, cid)
+
+            # 获取视频信息
+            if info is None:
+                with self.metrics.time("video_info"):
+                    info = await self.info_cache.get(v)
+            aid = info['aid']
+
+            # 第二级：UP主上传或B站AI生成的字幕
+            if self.prefer_native_subtitle:
+                with self.metrics.time("native_subtitle"):
+                    native = await self._fetch_native_subtitle(v, cid)
+                if native is not None:
+                    self.tier_stats["native"] += 1
+                    subtitle_path = self.cache.put(bvid, cid, native, title=info.get('title'))
+                    logger.info(f"字幕已保存到: {subtitle_path}")
+                    return native, subtitle_path
+
+            # 第三级：下载音频并识别字幕
+            
+            duration = next(
+                (page.get('duration', 0) for page in info.get('pages') or [] if page.get('cid') == cid),
+                info.get('duration', 0)
+            )
+
+            # 检查音频文件是否已存在，音频格式取决于识别后端
+            audio_path = os.path.join(self.audio_dir, f"{bvid}_{cid}_{self.asr_audio_profile}.{self.asr_backend.audio_extension}")
+            map_path = f"{audio_path}.timemap.json"
+            time_map = None
+            if self.cache.has_media(audio_path):
+                logger.info(f"音频文件已存在: {audio_path}")
+                if os.path.exists(map_path):
+                    with open(map_path, "r", encoding="utf-8") as f:
+                        time_map = TimeMap.load(f.read())
+            else:
+                # 优先只下载DASH音频流，没有时回退到下载MP4再分离音频
+                has_audio = False
+                if self.audio_only:
+                    try:
+                        has_audio, time_map = await self._download_dash_audio(bvid, aid, cid, audio_path, duration)
+                    except Exception as e:
+                        logger.warning(f"DASH音频获取失败，回退到MP4下载: {str(e)}")
+
+                if not has_audio:
+                    try:
+                        video_path = await self._download_video(bvid, aid, cid)
+                    except Exception as e:
+                        return None, f"无法获取视频: {str(e)}"
+                    time_map = await self._extract_audio(video_path, audio_path, duration)
+                self.cache.track_media(audio_path, bvid, cid)
+                if time_map:
+                    self.cache.track_media(map_path, bvid, cid)
+
+            # 记录上传给识别后端的音频大小，并与原先44.1kHz双声道192k的配置对比
+            audio_size = os.path.getsize(audio_path)
+            self.metrics.increment("asr_audio_bytes", audio_size)
+            if duration:
+                legacy_size = int(duration * 192000 / 8)
+                logger.info(f"音频文件大小: {audio_size} 字节（192k配置约 {legacy_size} 字节，{audio_size / legacy_size:.1%}）")
+            else:
+                logger.info(f"音频文件大小: {audio_size} 字节")
+
+            # 识别字幕，裁剪过静音时按裁剪后的时长切分，再把时间轴换算回原视频
+            logger.info("开始识别字幕")
+            audio_duration = time_map.duration if time_map else duration
+            if audio_duration > self.asr_segment_seconds:
+                subtitle = await self._recognize_segmented(audio_path, math.ceil(audio_duration))
+            else:
+                subtitle = await self._recognize(audio_path)
+            if time_map:
+                subtitle = time_map.remap(subtitle)
             if not subtitle.has_data():
-                yield None, "字幕识别失败或内容为空"
-                return
+                return None, "字幕识别失败或内容为空"
+
+            if subtitle.gaps:
+                # 部分分段识别失败，不写入缓存，保留音频以便下次重试
+                logger.warning(f"字幕缺失{len(subtitle.gaps)}个分段，本次结果不缓存")
+                self.tier_stats["asr"] += 1
+                return subtitle, None
 
-            # 保存字幕到字幕目录
-            subtitle_path = os.path.join(self.subtitle_dir, f"{v.get_bvid()}_subtitle.txt")
-            with open(subtitle_path, "w", encoding="utf-8") as f:
-                f.write(subtitle.to_txt())
+            # 保存字幕到缓存，同时删除已无用的音视频文件
+            self.tier_stats["asr"] += 1
+            subtitle_path = self.cache.put(bvid, cid, subtitle, title=info.get('title'))
             logger.info(f"字幕已保存到: {subtitle_path}")
 
-            yield subtitle, subtitle_path
-            return
+            return subtitle, subtitle_path
         except Exception as e:
             logger.error(f"获取字幕失败: {str(e)}")
-            yield None, f"获取字幕失败: {str(e)}"
-            return
+            return None, f"获取字幕失败: {str(e)}"
+
+    async def _llm_text(self, event, provider, prompt, system_prompt):
+        """调用LLM并返回回复文本，调用失败时抛出异常"""
+        req = event.request_llm(
+            prompt=prompt,
+            session_id=None,
+            system_prompt=system_prompt
+        )
+        with self.metrics.time("llm_summary"):
+            llm_response = await provider.text_chat(**req.__dict__)
+        if llm_response.role != "assistant":
+            raise Exception(llm_response.completion_text)
+        return llm_response.completion_text
+
+    async def _summarize_chunks(self, event, provider, title, subtitle):
+        """分段总结长字幕，返回按时间顺序拼接的各段总结
+
+        单段总结失败时使用该段字幕开头的内容代替，不影响其他分段。
+        """
+        chunks = subtitle.chunks(self.summary_chunk_chars)
+        logger.info(f"字幕过长，分{len(chunks)}段总结")
+
+        async def summarize(index, chunk):
+            start = int(chunk[0][0])
+            end = int(chunk[-1][1])
+            text = "\n".join(segment[2] for segment in chunk)
+            prompt = (
+                f"以下是视频《{title}》第{index + 1}/{len(chunks)}部分"
+                f"（{start // 60}:{start % 60:02d}-{end // 60}:{end % 60:02d}）的字幕，"
+                f"请用不超过150字概括这部分的主要内容。\n\n{text}"
+            )
+            try:
+                async with self.summary_semaphore:
+                    summary = await self._llm_text(event, provider, prompt, "你是一个擅长概括视频内容的助手。")
+            except Exception as e:
+                logger.warning(f"第{index + 1}段字幕总结失败: {str(e)}")
+                summary = text[:150]
+            return f"[{start // 60}:{start % 60:02d}] {summary.strip()}"
+
+        summaries = await asyncio.gather(*(summarize(index, chunk) for index, chunk in enumerate(chunks)))
+        return "\n".join(summaries)
+
+    def _metric_values(self):
+        """汇总各组件的计数和当前状态"""
+        counters = {}
+        for prefix, stats in (
+            ("transcript_cache", self.cache.stats),
+            ("video_info", self.info_cache.stats),
+            ("subtitle_tier", self.tier_stats),
+            ("prewarm", self.prewarm_stats),
+        ):
+            for name, value in stats.items():
+                counters[f"{prefix}_{name}"] = value
+        counters["ffmpeg_completed"] = self.ffmpeg_stats["completed"]
+        counters["ffmpeg_failed"] = self.ffmpeg_stats["failed"]
+        gauges = {
+            "queue_pending": self.scheduler.pending,
+            "queue_running": self.scheduler.running,
+            "ffmpeg_waiting": self.ffmpeg_stats["waiting"],
+            "ffmpeg_running": self.ffmpeg_stats["running"],
+        }
+        return counters, gauges
+
+    def dump_metrics(self):
+        """将指标以Prometheus文本格式写入数据目录，可配合node_exporter的textfile采集"""
+        try:
+            counters, gauges = self._metric_values()
+            temp_path = self._temp_path("metrics.prom")
+            with open(temp_path, "w", encoding="utf-8") as f:
+                f.write(self.metrics.render_prometheus(counters, gauges))
+            os.replace(temp_path, self.metrics_path)
+        except Exception as e:
+            logger.warning(f"写入指标文件失败: {str(e)}")
+
+    def format_stats(self):
+        """生成各阶段耗时的文字统计"""
+        lines = ["各阶段耗时 (次数 / p50 / p95):"]
+        for stage in sorted(self.metrics.counts):
+            p50 = self.metrics.percentile(stage, 50)
+            p95 = self.metrics.percentile(stage, 95)
+            lines.append(f"{stage}: {self.metrics.counts[stage]}次 / {p50:.2f}s / {p95:.2f}s")
+        if len(lines) == 1:
+            lines.append("暂无数据")
+
+        counters, gauges = self._metric_values()
+        counters.update(self.metrics.counters)
+        lines.append("")
+        lines.append("计数:")
+        lines.extend(f"{name}: {value}" for name, value in sorted(counters.items()))
+        lines.append("")
+        lines.append("当前状态:")
+        lines.extend(f"{name}: {value}" for name, value in sorted(gauges.items()))
+        return "\n".join(lines)
+
+    @filter.permission_type(filter.PermissionType.ADMIN)
+    @filter.command("bilisum_stats")
+    async def show_stats(self, event: AstrMessageEvent):
+        """查看视频点评各阶段的耗时统计"""
+        self.dump_metrics()
+        yield event.set_result(MessageEventResult().message(self.format_stats()))
 
     def _empty(self):
         pass
 
-    @llm_tool(name="video-review")
-    async def video_review(self, event: AstrMessageEvent, message: str = "") -> str:
-        """
-        对B站视频进行点评。当用户需要点评视频时，调用此函数。
-        函数会自动识别消息中的B站视频链接或BV号，下载视频，提取字幕，并生成点评。
+    def _ensure_prewarm(self):
+        """配置了UP主时启动后台预识别任务，插件加载时没有运行中的事件循环则在收到第一个请求时启动"""
+        if not self.prewarm_mids or self._prewarm_task is not None:
+            return
+        try:
+            self._prewarm_task = asyncio.get_running_loop().create_task(self._prewarm_loop())
+        except RuntimeError:
+            return
+        logger.info(f"已启动UP主投稿预识别，关注 {len(self.prewarm_mids)} 个UP主")
 
-        Args:
-            message (string): 用户的消息内容
+    async def _wait_idle(self):
+        """等待点评队列空闲，预识别只在没有用户请求时进行"""
+        while self.scheduler.pending or self.scheduler.running:
+            await asyncio.sleep(5)
+
+    async def _prewarm_loop(self):
+        """定期检查关注的UP主的最新投稿，提前识别字幕写入缓存"""
+        while True:
+            self.prewarm_stats["polls"] += 1
+            for mid in self.prewarm_mids:
+                try:
+                    await self._prewarm_uploader(mid)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.warning(f"检查UP主 {mid} 的投稿失败: {str(e)}")
+            await asyncio.sleep(self.prewarm_interval)
+
+    async def _prewarm_uploader(self, mid):
+        """预识别单个UP主最新的几个投稿"""
+        await self.prewarm_limiter.acquire()
+        uploads = await user.User(uid=int(mid), credential=self.credential).get_videos(ps=self.prewarm_per_mid)
+        vlist = ((uploads or {}).get("list") or {}).get("vlist") or []
+
+        for item in vlist[:self.prewarm_per_mid]:
+            bvid = item.get("bvid")
+            if not bvid:
+                continue
+            await self._wait_idle()
+            await self.prewarm_limiter.acquire()
+            v = video.Video(bvid=bvid, credential=self.credential)
+            try:
+                info = await self.info_cache.get(v)
+            except Exception as e:
+                self.prewarm_stats["failed"] += 1
+                logger.warning(f"获取 {bvid} 的视频信息失败: {str(e)}")
+                continue
+            # 只预识别P1，多P视频按P1的时长判断
+            pages = info.get('pages') or []
+            cid = pages[0]['cid'] if pages else info['cid']
+            duration = pages[0].get('duration', 0) if pages else info.get('duration', 0)
+            if duration > self.max_duration or self.cache.contains(bvid, cid):
+                self.prewarm_stats["skipped"] += 1
+                continue
+
+            logger.info(f"预识别UP主 {mid} 的投稿: {bvid}")
+            async for subtitle, result in self.get_best_subtitle(v, cid, info):
+                if subtitle is None:
+                    self.prewarm_stats["failed"] += 1
+                    logger.warning(f"预识别 {bvid} 失败: {result}")
+                else:
+                    self.prewarm_stats["videos"] += 1
+
+    def _submit_reviews(self, event, videos):
+        """将多个视频加入任务队列，队列已满的视频直接得到提示信息
 
         Returns:
-            string: 生成的视频点评或错误信息
+            list: (视频标签, 结果Future或提示信息, 排队位置)列表
         """
+        self._ensure_prewarm()
+        submitted = []
+        for bvid, page in videos[:self.batch_max_videos]:
+            label = bvid if page == 1 else f"{bvid} P{page}"
+            try:
+                future, position = self.scheduler.submit(
+                    event.unified_msg_origin, self.review_video, event, bvid, page
+                )
+                submitted.append((label, future, position))
+            except QueueFullError:
+                submitted.append((label, "当前排队点评的视频太多了，请稍后再试", 0))
+        return submitted
+
+    @staticmethod
+    async def _await_review(job):
+        """等待单个视频的点评结果，出错时返回错误信息而不影响其他视频"""
+        future = job[1]
+        if isinstance(future, str):
+            return future
         try:
-            # 提取BVID
-            import re
-            bvid_match = re.search(r'BV\w+', message)
-            if not bvid_match:
-                return "请在消息中包含B站视频的BV号"
+            return await future
+        except Exception as e:
+            return f"处理视频时出错: {str(e)}"
+
+    @staticmethod
+    def _combine_reviews(jobs, results):
+        """合并多个视频的点评结果"""
+        if len(results) == 1:
+            return results[0]
+        return "\n\n".join(f"【{job[0]}】\n{result}" for job, result in zip(jobs, results))
 
-            bvid = bvid_match.group()
+    async def queue_review(self, event: AstrMessageEvent, videos) -> str:
+        """通过任务队列并发点评多个视频，返回合并后的结果"""
+        jobs = self._submit_reviews(event, videos)
+        results = await asyncio.gather(*(self._await_review(job) for job in jobs))
+        return self._combine_reviews(jobs, results)
 
+    async def review_video(self, event: AstrMessageEvent, bvid: str, page: int = 1) -> str:
+        """获取视频指定分P的字幕并生成点评，视频信息在整个流程中只获取一次"""
+        try:
             # 创建视频对象
-            v = video.Video(bvid=bvid)
+            v = video.Video(bvid=bvid, credential=self.credential)
             
             # 获取视频信息
-            info = await v.get_info()
+            with self.metrics.time("video_info"):
+                info = await self.info_cache.get(v)
             title = info['title']
+            duration = info.get('duration', 0)
+            
+            # 获取 cid 和时长，有分P信息时使用对应分P的，视频的duration是所有分P的总时长
+            cid = info['cid']
+            pages = info.get('pages') or []
+            if page > 1 and page > len(pages):
+                return f"视频《{title}》只有{len(pages) or 1}个分P，找不到P{page}"
+            if pages:
+                part = pages[page - 1]
+                cid = part['cid']
+                duration = part.get('duration', duration)
+                if len(pages) > 1:
+                    title = f"{title} P{page} {part.get('part', '')}".strip()
             
             # 检查视频时长
-            duration = info.get('duration', 0)
             if duration > self.max_duration:
                 return f"视频《{title}》时长超过{self.max_duration//60}分钟（{duration//60}分{duration%60}秒），请选择更短的视频"
-            
-            # 获取 cid
-            cid = info['cid']
 
             # 获取最佳字幕
             subtitle = None
             subtitle_path = None
-            async for subtitle, result in self.get_best_subtitle(v, cid):
+            subtitle_started = time.perf_counter()
+            async for subtitle, result in self.get_best_subtitle(v, cid, info):
+                self.metrics.observe("subtitle", time.perf_counter() - subtitle_started)
                 if subtitle is None:
                     return f"视频《{title}》字幕获取失败: {result}"
                 subtitle_path = result
 
-            # 构建提示词
+            provider = self.context.get_using_provider()
+
+            # 构建提示词，字幕过长时先分段总结，再压缩到token预算以内
+            if subtitle and subtitle.has_data():
+                content = subtitle.to_txt()
+                if provider and len(content) > self.summary_chunk_chars:
+                    content = await self._summarize_chunks(event, provider, title, subtitle)
+                with self.metrics.time("compress"):
+                    content = compress_transcript(content, self.prompt_token_budget)
+            else:
+                content = "注意：由于无法获取视频字幕，请仅根据标题和简介进行点评。"
             prompt = self.prompt_template.format(
                 title=title,
                 desc=info.get('desc', '无简介'),
-                content=subtitle.to_txt() if subtitle and subtitle.has_data() else "注意：由于无法获取视频字幕，请仅根据标题和简介进行点评。"
+                content=content
             )
             
             # 调用LLM进行总结
-            provider = self.context.get_using_provider()
             if provider:
                 req = event.request_llm(
                     prompt=prompt,
                     session_id=None,
                     system_prompt=self.system_prompt
                 )
-                llm_response = await provider.text_chat(**req.__dict__)
+                with self.metrics.time("llm_review"):
+                    llm_response = await provider.text_chat(**req.__dict__)
                 
                 if llm_response.role == "assistant":
                     review_text = llm_response.completion_text
-                    # 获取当前对话ID
-                    conversation_id = await self.context.conversation_manager.get_curr_conversation_id(event.unified_msg_origin)
-                    if not conversation_id:
-                        conversation_id = await self.context.conversation_manager.new_conversation(event.unified_msg_origin)
-                    
-                    # 获取当前对话历史
-                    conversation = await self.context.conversation_manager.get_conversation(event.unified_msg_origin, conversation_id)
-                    history = json.loads(conversation.history) if conversation else []
-                    
-                    # 添加新的对话记录
-                    history.append({"role": "user", "content": prompt})
-                    history.append({"role": "assistant", "content": review_text})
-                    
-                    # 更新对话历史
-                    await self.context.conversation_manager.update_conversation(
-                        unified_msg_origin=event.unified_msg_origin,
-                        conversation_id=conversation_id,
-                        history=json.dumps(history)
-                    )
+                    self.history_writer.append(event.unified_msg_origin, prompt, review_text)
                     return review_text
                 else:
                     error_msg = f"视频点评失败：{llm_response.completion_text}"
-                    # 获取当前对话ID
-                    conversation_id = await self.context.conversation_manager.get_curr_conversation_id(event.unified_msg_origin)
-                    if not conversation_id:
-                        conversation_id = await self.context.conversation_manager.new_conversation(event.unified_msg_origin)
-                    
-                    # 获取当前对话历史
-                    conversation = await self.context.conversation_manager.get_conversation(event.unified_msg_origin, conversation_id)
-                    history = json.loads(conversation.history) if conversation else []
-                    
-                    # 添加错误信息到对话历史
-                    history.append({"role": "user", "content": prompt})
-                    history.append({"role": "assistant", "content": error_msg})
-                    
-                    # 更新对话历史
-                    await self.context.conversation_manager.update_conversation(
-                        unified_msg_origin=event.unified_msg_origin,
-                        conversation_id=conversation_id,
-                        history=json.dumps(history)
-                    )
+                    self.history_writer.append(event.unified_msg_origin, prompt, error_msg)
                     return error_msg
             else:
                 error_msg = "未配置LLM提供商，无法进行视频点评"
-                # 获取当前对话ID
-                conversation_id = await self.context.conversation_manager.get_curr_conversation_id(event.unified_msg_origin)
-                if not conversation_id:
-                    conversation_id = await self.context.conversation_manager.new_conversation(event.unified_msg_origin)
-                
-                # 获取当前对话历史
-                conversation = await self.context.conversation_manager.get_conversation(event.unified_msg_origin, conversation_id)
-                history = json.loads(conversation.history) if conversation else []
-                
-                # 添加错误信息到对话历史
-                history.append({"role": "user", "content": prompt})
-                history.append({"role": "assistant", "content": error_msg})
-                
-                # 更新对话历史
-                await self.context.conversation_manager.update_conversation(
-                    unified_msg_origin=event.unified_msg_origin,
-                    conversation_id=conversation_id,
-                    history=json.dumps(history)
-                )
+                self.history_writer.append(event.unified_msg_origin, prompt, error_msg)
                 return error_msg
 
         except Exception as e:
             return f"处理视频时出错: {str(e)}"
 
+    @llm_tool(name="video-review")
+    async def video_review(self, event: AstrMessageEvent, message: str = "") -> str:
+        """
+        对B站视频进行点评。当用户需要点评视频时，调用此函数。
+        函数会自动识别消息中的B站视频链接或BV号，下载视频，提取字幕，并生成点评。
+
+        Args:
+            message (string): 用户的消息内容
+
+        Returns:
+            string: 生成的视频点评或错误信息
+        """
+        try:
+            # 提取消息中的所有视频
+            videos = await self.find_videos(message)
+            if not videos:
+                return "请在消息中包含B站视频的BV号"
+
+            return await self.queue_review(event, videos)
+
+        except Exception as e:
+            return f"处理视频时出错: {str(e)}"
+
     @llm_tool(name="process-video")
     async def process_video(self, event: AstrMessageEvent, bvid: str = "") -> str:
         """
@@ -404,102 +2242,52 @@ class BiliSumPlugin(Star):
             string: 处理结果
         """
         try:
-            # 创建视频对象
-            v = video.Video(bvid=bvid)
-            
-            # 获取视频信息
-            info = await v.get_info()
-            title = info['title']
-            
-            # 检查视频时长
-            duration = info.get('duration', 0)
-            if duration > self.max_duration:
-                return f"视频《{title}》时长超过{self.max_duration//60}分钟（{duration//60}分{duration%60}秒），请选择更短的视频"
-            
-            # 获取 cid
-            cid = info['cid']
-
-            # 获取最佳字幕
-            subtitle = None
-            subtitle_path = None
-            async for subtitle, result in self.get_best_subtitle(v, cid):
-                if subtitle is None:
-                    return f"视频《{title}》字幕获取失败: {result}"
-                subtitle_path = result
-
-            # 使用LLM总结字幕内容
-            try:
-                if subtitle and subtitle.has_data():
-                    review = await self.video_review(event, subtitle.to_txt())
-                else:
-                    review = await self.video_review(event, "注意：由于无法获取视频字幕，请仅根据标题和简介进行点评。")
-                
-                return review
-            except Exception as e:
-                error_msg = f"视频点评失败: {str(e)}"
-                if subtitle_path:
-                    return f"视频《{title}》的字幕已保存到：{subtitle_path}\n注意：{error_msg}"
-                else:
-                    return f"视频《{title}》的字幕获取失败，且{error_msg}"
-
+            return await self.queue_review(event, [(bvid, 1)])
         except Exception as e:
             return f"处理视频时出错: {str(e)}"
 
-    @filter.regex(r".*")
+    @filter.regex(VIDEO_MESSAGE_REGEX)
     async def handle_message(self, event: AstrMessageEvent):
-        """处理所有消息，通过LLM识别是否需要处理视频"""
+        """处理包含B站视频链接或BV号的消息，在本地识别视频，不调用LLM"""
         try:
-            # 获取当前对话ID
-            conversation_id = await self.context.conversation_manager.get_curr_conversation_id(event.unified_msg_origin)
-            if not conversation_id:
-                conversation_id = await self.context.conversation_manager.new_conversation(event.unified_msg_origin)
-            
-            # 获取当前对话历史
-            conversation = await self.context.conversation_manager.get_conversation(event.unified_msg_origin, conversation_id)
-            history = json.loads(conversation.history) if conversation else []
-            
-            # 构建系统提示词
-            system_prompt = """你是一个视频处理助手。当用户发送的消息中包含B站视频链接或BV号时，你需要：
-1. 识别出视频的BV号
-2. 调用process-video函数来处理视频
-3. 如果消息中没有视频链接或BV号，则不做任何处理
-
-请只返回JSON格式的响应，格式如下：
-{
-    "has_video": true/false,
-    "bvid": "视频的BV号（如果有）",
-    "message": "你的回复消息"
-}"""
-
-            # 调用LLM进行消息处理
-            provider = self.context.get_using_provider()
-            if provider:
-                req = event.request_llm(
-                    prompt=event.message_str,
-                    session_id=None,
-                    system_prompt=system_prompt
-                )
-                llm_response = await provider.text_chat(**req.__dict__)
-                
-                if llm_response.role == "assistant":
-                    try:
-                        response = json.loads(llm_response.completion_text)
-                        if response.get("has_video", False) and response.get("bvid"):
-                            # 处理视频
-                            result = await self.process_video(event, response["bvid"])
-                            yield event.set_result(MessageEventResult().message(result))
-                        else:
-                            # 不是视频相关消息，不做处理
-                            return
-                    except json.JSONDecodeError:
-                        # LLM返回的不是有效的JSON，不做处理
-                        return
+            videos = await self.find_videos(event.message_str)
+            if not videos:
+                # 不是视频相关消息，不做处理
+                return
+
+            # 加入任务队列，先回复排队情况，处理完成后再回复点评
+            jobs = self._submit_reviews(event, videos)
+            queued = [job for job in jobs if not isinstance(job[1], str)]
+            if not queued:
+                yield event.set_result(MessageEventResult().message(jobs[0][1]))
+                return
+
+            free_workers = self.scheduler.workers - self.scheduler.running
+            if len(jobs) == 1:
+                label, _, position = jobs[0]
+                if position > free_workers:
+                    ack = f"收到，视频{label}已加入队列，当前排在第{position}位"
                 else:
-                    # LLM调用失败，不做处理
-                    return
+                    ack = f"收到，正在看视频{label}，请稍等"
             else:
-                # 未配置LLM提供商，不做处理
-                return
+                ack = f"收到，共{len(jobs)}个视频，最靠后的排在第{max(job[2] for job in queued)}位"
+                if len(videos) > self.batch_max_videos:
+                    ack += f"（每条消息最多点评{self.batch_max_videos}个视频，其余已忽略）"
+            yield event.set_result(MessageEventResult().message(ack))
+
+            if self.batch_reply_mode == "separate":
+                # 每个视频完成后单独回复
+                async def labelled(job):
+                    return job[0], await self._await_review(job)
+
+                for next_done in asyncio.as_completed([labelled(job) for job in jobs]):
+                    label, result = await next_done
+                    if len(jobs) > 1:
+                        result = f"【{label}】\n{result}"
+                    yield event.set_result(MessageEventResult().message(result))
+            else:
+                results = await asyncio.gather(*(self._await_review(job) for job in jobs))
+                yield event.set_result(MessageEventResult().message(self._combine_reviews(jobs, results)))
 
         except Exception as e:
             logger.error(f"处理消息时出错: {str(e)}")
@@ -0,0 +1,22 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import main  # noqa: E402
+from stand_ins import StubContext  # noqa: E402
+
+
+@pytest.fixture
+def make_plugin(tmp_path):
+    """创建使用临时数据目录的插件实例，需要在事件循环中调用并在结束时terminate"""
+
+    def factory(context=None, **config):
+        context = context or StubContext(str(tmp_path))
+        context.data_path = str(tmp_path)
+        return main.BiliSumPlugin(context, config)
+
+    return factory
@@ -0,0 +1,294 @@
+"""测试用的本地HTTP服务器及其他替身"""
+import asyncio
+import json
+import types
+import urllib.parse
+
+import httpx
+
+
+class Request:
+    def __init__(self, method, target, headers, body):
+        url = urllib.parse.urlsplit(target)
+        self.method = method
+        self.path = url.path
+        self.query = {key: values[0] for key, values in urllib.parse.parse_qs(url.query).items()}
+        self.headers = headers
+        self.body = body
+
+
+class LocalHTTPServer:
+    """在127.0.0.1上监听的最小HTTP/1.1服务器
+
+    handler(request, writer)负责写出完整的响应，可以故意写出不完整的内容或直接断开连接，
+    用于模拟CDN和接口的各种异常。
+    """
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.requests = []
+        self.connections = 0
+        self._server = None
+        self.port = None
+
+    async def __aenter__(self):
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def __aexit__(self, *exc):
+        self._server.close()
+        await self._server.wait_closed()
+
+    def url(self, path="/"):
+        return f"http://127.0.0.1:{self.port}{path}"
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        try:
+            while not writer.is_closing():
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, _ = request_line.decode().split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode().partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length") or 0)
+                body = await reader.readexactly(length) if length else b""
+                request = Request(method, target, headers, body)
+                self.requests.append(request)
+                await self.handler(request, writer)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+class LocalTransport(httpx.AsyncBaseTransport):
+    """将发往任意主机的请求转发到本地服务器，原主机名保留在Host请求头中"""
+
+    def __init__(self, port):
+        self.port = port
+        self.transport = httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request):
+        request.url = request.url.copy_with(scheme="http", host="127.0.0.1", port=self.port)
+        return await self.transport.handle_async_request(request)
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+async def route_to(plugin, server):
+    """让插件的所有HTTP请求都发往server"""
+    await plugin.http_client.aclose()
+    plugin.http_client = httpx.AsyncClient(transport=LocalTransport(server.port), follow_redirects=True)
+
+
+REASONS = {200: "OK", 206: "Partial Content", 302: "Found", 404: "Not Found", 416: "Range Not Satisfiable",
+           500: "Internal Server Error", 502: "Bad Gateway", 503: "Service Unavailable"}
+
+
+def write_head(writer, status, headers):
+    lines = [f"HTTP/1.1 {status} {REASONS.get(status, 'Unknown')}"]
+    lines.extend(f"{name}: {value}" for name, value in headers.items())
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode())
+
+
+async def send(writer, status, body=b"", headers=None):
+    """写出完整的响应"""
+    headers = dict(headers or {})
+    headers.setdefault("Content-Length", str(len(body)))
+    write_head(writer, status, headers)
+    writer.write(body)
+    await writer.drain()
+
+
+async def send_json(writer, data, status=200):
+    await send(writer, status, json.dumps(data).encode(), {"Content-Type": "application/json"})
+
+
+class StubConversationManager:
+    """记录写入次数的对话管理器，write_delay用于模拟较慢的存储"""
+
+    def __init__(self, write_delay=0.0):
+        self.write_delay = write_delay
+        self.histories = {}
+        self.writes = 0
+
+    async def get_curr_conversation_id(self, unified_msg_origin):
+        return unified_msg_origin
+
+    async def new_conversation(self, unified_msg_origin):
+        return unified_msg_origin
+
+    async def get_conversation(self, unified_msg_origin, conversation_id):
+        return types.SimpleNamespace(history=self.histories.get(unified_msg_origin, "[]"))
+
+    async def update_conversation(self, unified_msg_origin, conversation_id, history):
+        await asyncio.sleep(self.write_delay)
+        self.histories[unified_msg_origin] = history
+        self.writes += 1
+
+
+class StubContext:
+    def __init__(self, data_path, provider=None, conversation_manager=None):
+        self.data_path = data_path
+        self.provider = provider
+        self.conversation_manager = conversation_manager or StubConversationManager()
+
+    def get_config(self):
+        return {"data_path": self.data_path}
+
+    def get_using_provider(self):
+        return self.provider
+
+
+class StubEvent:
+    def __init__(self, unified_msg_origin="test:session", message_str=""):
+        self.unified_msg_origin = unified_msg_origin
+        self.message_str = message_str
+
+    def request_llm(self, prompt, session_id=None, system_prompt=None, **kwargs):
+        return types.SimpleNamespace(prompt=prompt, session_id=session_id, system_prompt=system_prompt)
+
+
+class FakeBcutServer:
+    """必剪语音识别接口的本地替身
+
+    按必剪的流程提供 申请上传 -> 分片上传 -> 完成上传 -> 创建任务 -> 查询结果 接口。
+    查询结果时前polls_until_done次返回运行中，之后按outcome返回完成或失败；
+    outcome为"running"时任务一直不结束。upload_delay用于模拟卡住的分片上传。
+    """
+
+    BASE = "/x/bcut/rubick-interface"
+
+    def __init__(self, polls_until_done=2, outcome="complete", per_size=1024, upload_delay=0.0):
+        self.polls_until_done = polls_until_done
+        self.outcome = outcome
+        self.per_size = per_size
+        self.upload_delay = upload_delay
+        self.uploaded = {}
+        self.tasks = {}
+        self.poll_times = []
+        self.server = LocalHTTPServer(self.handle)
+
+    async def __aenter__(self):
+        await self.server.__aenter__()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.server.__aexit__(*exc)
+
+    def url(self, path):
+        return self.server.url(path)
+
+    async def handle(self, request, writer):
+        path = request.path
+        if path == f"{self.BASE}/resource/create":
+            form = urllib.parse.parse_qs(request.body.decode())
+            size = int(form["size"][0])
+            resource_id = f"res{len(self.uploaded) + 1}"
+            self.uploaded[resource_id] = {}
+            clips = max((size + self.per_size - 1) // self.per_size, 1)
+            await send_json(writer, {"code": 0, "data": {
+                "resource_id": resource_id,
+                "upload_id": f"up-{resource_id}",
+                "in_boss_key": f"boss-{resource_id}",
+                "per_size": self.per_size,
+                "upload_urls": [self.url(f"/upload/{resource_id}/{index}") for index in range(clips)],
+            }})
+        elif path.startswith("/upload/") and request.method == "PUT":
+            _, _, resource_id, index = path.split("/")
+            await asyncio.sleep(self.upload_delay)
+            self.uploaded[resource_id][int(index)] = request.body
+            await send(writer, 200, headers={"Etag": f"etag-{resource_id}-{index}"})
+        elif path == f"{self.BASE}/resource/create/complete":
+            form = urllib.parse.parse_qs(request.body.decode())
+            resource_id = form["resource_id"][0]
+            await send_json(writer, {"code": 0, "data": {"download_url": f"https://boss.hdslb.com/{resource_id}"}})
+        elif path == f"{self.BASE}/task":
+            task_id = f"task{len(self.tasks) + 1}"
+            self.tasks[task_id] = {"resource": json.loads(request.body)["resource"], "polls": 0}
+            await send_json(writer, {"code": 0, "data": {"resource": self.tasks[task_id]["resource"], "task_id": task_id}})
+        elif path == f"{self.BASE}/task/result":
+            self.poll_times.append(asyncio.get_running_loop().time())
+            task = self.tasks[request.query["task_id"]]
+            task["polls"] += 1
+            data = {"task_id": request.query["task_id"], "state": 1, "remark": "", "result": ""}
+            if task["polls"] > self.polls_until_done and self.outcome == "complete":
+                data["state"] = 4
+                data["result"] = json.dumps({"utterances": [
+                    {"start_time": 0, "end_time": 1500, "transcript": "第一句"},
+                    {"start_time": 1500, "end_time": 3200, "transcript": "第二句"},
+                ]})
+            elif task["polls"] > self.polls_until_done and self.outcome == "error":
+                data["state"] = 3
+                data["remark"] = "音频解码失败"
+            await send_json(writer, {"code": 0, "data": data})
+        else:
+            await send(writer, 404, b"not found")
+
+
+class FakeBcutClient:
+    """与bcut_asr.BcutASR接口相同的同步客户端，访问FakeBcutServer
+
+    bcut_asr的接口地址固定为B站线上服务，测试时由BcutASRBackend的client_factory创建此客户端。
+    """
+
+    def __init__(self, base_url, audio_path, state_enum):
+        self.base_url = base_url
+        self.state_enum = state_enum
+        with open(audio_path, "rb") as f:
+            self.data = f.read()
+        self.name = audio_path.rsplit("/", 1)[-1]
+        self.session = httpx.Client(timeout=10)
+        self.download_url = None
+        self.task_id = None
+
+    def _post(self, path, **kwargs):
+        response = self.session.post(f"{self.base_url}{FakeBcutServer.BASE}{path}", **kwargs)
+        response.raise_for_status()
+        body = response.json()
+        if body["code"]:
+            raise Exception(body.get("message"))
+        return body["data"]
+
+    def upload(self):
+        data = self._post("/resource/create", data={
+            "type": 2, "name": self.name, "size": len(self.data), "resource_file_type": "m4a", "model_id": 7,
+        })
+        etags = []
+        per_size = data["per_size"]
+        for index, upload_url in enumerate(data["upload_urls"]):
+            response = self.session.put(upload_url, content=self.data[index * per_size:(index + 1) * per_size])
+            response.raise_for_status()
+            etags.append(response.headers["Etag"])
+        complete = self._post("/resource/create/complete", data={
+            "in_boss_key": data["in_boss_key"], "resource_id": data["resource_id"],
+            "etags": ",".join(etags), "upload_id": data["upload_id"], "model_id": 7,
+        })
+        self.download_url = complete["download_url"]
+
+    def create_task(self):
+        self.task_id = self._post("/task", json={"resource": self.download_url, "model_id": "7"})["task_id"]
+        return self.task_id
+
+    def result(self):
+        response = self.session.get(
+            f"{self.base_url}{FakeBcutServer.BASE}/task/result", params={"model_id": 7, "task_id": self.task_id}
+        )
+        response.raise_for_status()
+        data = response.json()["data"]
+        raw_result = data["result"]
+
+        def parse():
+            utterances = json.loads(raw_result)["utterances"]
+            return types.SimpleNamespace(utterances=[types.SimpleNamespace(**item) for item in utterances])
+
+        return types.SimpleNamespace(state=self.state_enum(data["state"]), remark=data["remark"], parse=parse)
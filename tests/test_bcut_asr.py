@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+
+import main
+from stand_ins import FakeBcutClient, FakeBcutServer
+
+
+def make_backend(server, **kwargs):
+    return main.BcutASRBackend(
+        main.Metrics(),
+        client_factory=lambda audio_path: FakeBcutClient(server.url(""), audio_path, main.ResultStateEnum),
+        **kwargs
+    )
+
+
+@pytest.fixture
+def audio_file(tmp_path):
+    path = tmp_path / "audio.m4a"
+    path.write_bytes(bytes(range(256)) * 10)
+    return str(path)
+
+
+def test_polls_until_complete(audio_file):
+    async def scenario():
+        async with FakeBcutServer(polls_until_done=3) as server:
+            backend = make_backend(server, timeout=10, poll_interval=0.05)
+            transcript = await backend.transcribe(audio_file)
+            return server, backend, transcript
+
+    server, backend, transcript = asyncio.run(scenario())
+    assert transcript.segments == [(0.0, 1.5, "第一句"), (1.5, 3.2, "第二句")]
+    # 音频按分片完整上传
+    chunks = server.uploaded["res1"]
+    assert b"".join(chunks[index] for index in sorted(chunks)) == open(audio_file, "rb").read()
+    assert len(server.poll_times) == 4
+    # 轮询间隔按指数退避增长（抖动范围为0.5~1.5倍）
+    gaps = [later - earlier for earlier, later in zip(server.poll_times, server.poll_times[1:])]
+    assert gaps[-1] > 0.05 * 4 * 0.5
+    for stage in ("asr_upload", "asr_create_task", "asr_recognize"):
+        assert backend.metrics.counts[stage] == 1
+
+
+def test_task_failure_raises(audio_file):
+    async def scenario():
+        async with FakeBcutServer(polls_until_done=1, outcome="error") as server:
+            backend = make_backend(server, timeout=10, poll_interval=0.05)
+            with pytest.raises(Exception, match="必剪识别任务失败: 音频解码失败"):
+                await backend.transcribe(audio_file)
+
+    asyncio.run(scenario())
+
+
+def test_gives_up_after_timeout(audio_file):
+    async def scenario():
+        async with FakeBcutServer(outcome="running") as server:
+            backend = make_backend(server, timeout=0.5, poll_interval=0.05, poll_max_interval=0.2)
+            loop = asyncio.get_running_loop()
+            started = loop.time()
+            with pytest.raises(Exception, match="字幕识别超时"):
+                await backend.transcribe(audio_file)
+            elapsed = loop.time() - started
+            return server, elapsed
+
+    server, elapsed = asyncio.run(scenario())
+    # 不会超过截止时间太多，且在截止前一直在轮询
+    assert elapsed < 1.5
+    assert len(server.poll_times) >= 3
+
+
+def test_stuck_upload_counts_against_timeout(audio_file):
+    async def scenario():
+        async with FakeBcutServer(upload_delay=2) as server:
+            backend = make_backend(server, timeout=0.5, poll_interval=0.05)
+            loop = asyncio.get_running_loop()
+            started = loop.time()
+            with pytest.raises(Exception, match="字幕识别超时"):
+                await backend.transcribe(audio_file)
+            return server, loop.time() - started
+
+    server, elapsed = asyncio.run(scenario())
+    # 上传卡住时不等到上传结束，也不会创建识别任务
+    assert elapsed < 1.5
+    assert server.tasks == {}
@@ -0,0 +1,62 @@
+import asyncio
+
+import main
+from stand_ins import LocalHTTPServer, send, send_json
+
+
+def scripted_server(statuses):
+    """按顺序返回statuses中的状态码，用完后一直返回200"""
+    remaining = list(statuses)
+
+    async def handler(request, writer):
+        status = remaining.pop(0) if remaining else 200
+        if status == 200:
+            await send_json(writer, {"code": 0, "data": {"ok": True}})
+        else:
+            await send(writer, status, b"error")
+
+    return handler
+
+
+async def request(handler, max_retries):
+    async with LocalHTTPServer(handler) as server:
+        client = main.create_http_client()
+        try:
+            result = await main.bili_request(server.url("/x/web-interface/view"), client=client, max_retries=max_retries)
+        finally:
+            await client.aclose()
+        return result, len(server.requests)
+
+
+def test_retries_5xx_until_success():
+    result, count = asyncio.run(request(scripted_server([503, 502]), max_retries=2))
+    assert result == {"code": 0, "data": {"ok": True}}
+    assert count == 3
+
+
+def test_gives_up_after_max_retries():
+    result, count = asyncio.run(request(scripted_server([500, 500, 500]), max_retries=1))
+    assert result["code"] == -400
+    assert count == 2
+
+
+def test_does_not_retry_4xx():
+    result, count = asyncio.run(request(scripted_server([404]), max_retries=3))
+    assert result["code"] == -400
+    assert count == 1
+
+
+def test_shared_client_reuses_connection():
+    async def scenario():
+        async with LocalHTTPServer(scripted_server([])) as server:
+            client = main.create_http_client()
+            try:
+                for _ in range(5):
+                    await main.bili_request(server.url("/x/web-interface/view"), client=client)
+            finally:
+                await client.aclose()
+            return server
+
+    server = asyncio.run(scenario())
+    assert len(server.requests) == 5
+    assert server.connections == 1
@@ -0,0 +1,51 @@
+import os
+
+import pytest
+
+import main
+
+SUBTITLE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "subtitle.txt")
+
+
+@pytest.fixture
+def subtitle_text():
+    with open(SUBTITLE_PATH, "r", encoding="utf-8") as f:
+        return main.Transcript.load(f.read()).to_txt()
+
+
+def test_within_budget_only_removes_duplicates(subtitle_text):
+    compressed = main.compress_transcript(subtitle_text, 100000)
+    lines = compressed.splitlines()
+    assert len(lines) == len(set(lines))
+    assert subtitle_text.count("永不放弃你,不让你失望") > 1
+    assert compressed.count("永不放弃你,不让你失望") == 1
+
+
+@pytest.mark.parametrize("budget", [20, 50, 150])
+def test_over_budget_keeps_order_and_budget(subtitle_text, budget):
+    compressed = main.compress_transcript(subtitle_text, budget)
+    assert compressed
+    assert main.estimate_tokens(compressed) <= budget
+    # 选中的句子保持原来的先后顺序
+    positions = [subtitle_text.find(line.split("，")[0]) for line in compressed.splitlines()]
+    assert positions == sorted(positions)
+
+
+def test_long_unpunctuated_line_is_never_empty():
+    text = "这是一段没有任何标点的很长的语音识别结果" * 250
+    compressed = main.compress_transcript(text, 100)
+    assert compressed
+    assert main.estimate_tokens(compressed) <= 100
+
+
+def test_budget_smaller_than_any_sentence_truncates():
+    text = "\n".join(f"第{index}句是一段比预算更长的字幕内容，用来检查截断" for index in range(20))
+    compressed = main.compress_transcript(text, 5)
+    assert compressed
+    assert main.estimate_tokens(compressed) <= 5
+
+
+def test_truncate_to_tokens():
+    assert main.truncate_to_tokens("短句", 10) == "短句"
+    truncated = main.truncate_to_tokens("一二三四五六七八九十" * 10, 15)
+    assert 0 < main.estimate_tokens(truncated) <= 15
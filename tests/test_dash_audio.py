@@ -0,0 +1,110 @@
+import asyncio
+import json
+import os
+import shutil
+import time
+
+import main
+from stand_ins import LocalHTTPServer, route_to, send, send_json
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+AUDIO = b"\x00\x00\x00\x18ftypdash" + b"a" * 4096
+VIDEO = b"\x00\x00\x00\x18ftypmp42" + b"v" * 8192
+
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURES, name), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_select_lowest_bandwidth_audio_with_backups():
+    urls = main.select_dash_audio(load_fixture("playurl_dash_audio.json")["data"])
+    assert urls == [
+        "https://upos-sz-mirrorcos.bilivideo.com/upgcxcode/00/00/200001/200001-1-30216.m4s",
+        "https://upos-sz-mirrorali.bilivideo.com/upgcxcode/00/00/200001/200001-1-30216.m4s",
+        "https://upos-sz-mirrorhw.bilivideo.com/upgcxcode/00/00/200001/200001-1-30216.m4s",
+    ]
+
+
+def test_select_without_dash_audio():
+    assert main.select_dash_audio(load_fixture("playurl_dash_no_audio.json")["data"]) == []
+    assert main.select_dash_audio(load_fixture("playurl_durl.json")["data"]) == []
+
+
+def bili_server(playurl_fixture, broken_hosts=()):
+    """按playurl请求的类型返回录制的接口数据，broken_hosts中的CDN主机返回404"""
+
+    async def handler(request, writer):
+        host = request.headers.get("host", "")
+        if request.path == "/x/player/playurl":
+            if request.query.get("fnval") == "16":
+                await send_json(writer, load_fixture(playurl_fixture))
+            else:
+                await send_json(writer, load_fixture("playurl_durl.json"))
+        elif host in broken_hosts:
+            await send(writer, 404, b"not found")
+        elif request.path.endswith(".m4s"):
+            await send(writer, 200, AUDIO)
+        elif request.path.endswith(".mp4"):
+            await send(writer, 200, VIDEO)
+        else:
+            await send(writer, 404, b"not found")
+
+    return handler
+
+
+async def fake_extract_audio(source_path, audio_path, duration=0, remux=False):
+    """代替FFmpeg，直接复制下载的音频流"""
+    shutil.copy(source_path, audio_path)
+    return None
+
+
+def test_dash_audio_falls_back_to_backup_url(make_plugin, tmp_path):
+    async def scenario():
+        plugin = make_plugin()
+        plugin._extract_audio = fake_extract_audio
+        try:
+            handler = bili_server("playurl_dash_audio.json", broken_hosts=("upos-sz-mirrorcos.bilivideo.com",))
+            async with LocalHTTPServer(handler) as server:
+                await route_to(plugin, server)
+                audio_path = str(tmp_path / "audio.m4a")
+                started = time.perf_counter()
+                ok, time_map = await plugin._download_dash_audio("BV1xx411c7mD", 100001, 200001, audio_path)
+                seconds = time.perf_counter() - started
+                hosts = [request.headers["host"] for request in server.requests if request.path.endswith(".m4s")]
+            assert ok and time_map is None
+            with open(audio_path, "rb") as f:
+                assert f.read() == AUDIO
+            # 先请求码率最低的音频流主地址，404后不重试，直接换到第一个备用地址
+            assert hosts == ["upos-sz-mirrorcos.bilivideo.com", "upos-sz-mirrorali.bilivideo.com"]
+            assert hosts.count("upos-sz-mirrorcos.bilivideo.com") == 1
+            assert seconds < 1
+        finally:
+            await plugin.terminate()
+
+    asyncio.run(scenario())
+
+
+def test_no_dash_audio_falls_back_to_mp4(make_plugin, tmp_path):
+    async def scenario():
+        plugin = make_plugin()
+        plugin._extract_audio = fake_extract_audio
+        try:
+            async with LocalHTTPServer(bili_server("playurl_dash_no_audio.json")) as server:
+                await route_to(plugin, server)
+                audio_path = str(tmp_path / "audio.m4a")
+                ok, _ = await plugin._download_dash_audio("BV1xx411c7mD", 100002, 200002, audio_path)
+                assert not ok
+                assert not os.path.exists(audio_path)
+
+                # 没有DASH音频时下载durl中的MP4
+                video_path = await plugin._download_video("BV1xx411c7mD", 100002, 200002)
+                paths = [request.path for request in server.requests]
+            with open(video_path, "rb") as f:
+                assert f.read() == VIDEO
+            assert paths[-1].endswith("200002-1-16.mp4")
+            assert not any(path.endswith(".m4s") for path in paths)
+        finally:
+            await plugin.terminate()
+
+    asyncio.run(scenario())
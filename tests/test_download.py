@@ -0,0 +1,225 @@
+import asyncio
+import os
+import time
+import tracemalloc
+
+import pytest
+
+from stand_ins import LocalHTTPServer, send, write_head
+
+PAYLOAD = bytes(range(256)) * 4096  # 1MB
+
+
+def file_server(payload, drop_after=None, honor_range=True):
+    """提供payload的CDN替身
+
+    drop_after: 第一次请求发送这么多字节后断开连接
+    honor_range: 为False时忽略Range，总是返回200和完整内容
+    """
+    state = {"dropped": False}
+
+    async def handler(request, writer):
+        offset = 0
+        range_header = request.headers.get("range")
+        if honor_range and range_header:
+            offset = int(range_header[len("bytes="):].split("-")[0])
+            if offset >= len(payload):
+                await send(writer, 416, headers={"Content-Range": f"bytes */{len(payload)}"})
+                return
+            write_head(writer, 206, {
+                "Content-Length": str(len(payload) - offset),
+                "Content-Range": f"bytes {offset}-{len(payload) - 1}/{len(payload)}",
+            })
+        else:
+            write_head(writer, 200, {"Content-Length": str(len(payload))})
+
+        # 分块发送，服务端不额外占用内存
+        body = memoryview(payload)[offset:]
+        if drop_after is not None and not state["dropped"]:
+            state["dropped"] = True
+            writer.write(body[:drop_after])
+            await writer.drain()
+            writer.close()
+            return
+        for start in range(0, len(body), 65536):
+            writer.write(body[start:start + 65536])
+            await writer.drain()
+
+    return handler
+
+
+def test_download_complete(make_plugin, tmp_path):
+    async def scenario():
+        plugin = make_plugin()
+        try:
+            async with LocalHTTPServer(file_server(PAYLOAD)) as server:
+                path = str(tmp_path / "video.mp4")
+                size = await plugin.download_stream(server.url("/video.mp4"), {}, path, max_retries=0)
+            assert size == len(PAYLOAD)
+            with open(path, "rb") as f:
+                assert f.read() == PAYLOAD
+        finally:
+            await plugin.terminate()
+
+    asyncio.run(scenario())
+
+
+def test_resume_after_dropped_connection(make_plugin, tmp_path):
+    async def scenario():
+        plugin = make_plugin()
+        try:
+            async with LocalHTTPServer(file_server(PAYLOAD, drop_after=300000)) as server:
+                path = str(tmp_path / "video.mp4")
+                size = await plugin.download_stream(server.url("/video.mp4"), {}, path, max_retries=1)
+                ranges = [request.headers.get("range") for request in server.requests]
+            assert size == len(PAYLOAD)
+            with open(path, "rb") as f:
+                assert f.read() == PAYLOAD
+            # 第二次请求从已写入的位置继续
+            assert ranges[0] is None
+            assert ranges[1].startswith("bytes=") and int(ranges[1][6:].rstrip("-")) > 0
+        finally:
+            await plugin.terminate()
+
+    asyncio.run(scenario())
+
+
+def test_restart_when_range_ignored(make_plugin, tmp_path):
+    async def scenario():
+        plugin = make_plugin()
+        try:
+            handler = file_server(PAYLOAD, drop_after=300000, honor_range=False)
+            async with LocalHTTPServer(handler) as server:
+                path = str(tmp_path / "video.mp4")
+                size = await plugin.download_stream(server.url("/video.mp4"), {}, path, max_retries=1)
+                assert server.requests[1].headers.get("range")
+            # 服务器返回200时从头重新写入，而不是追加到已下载的部分后面
+            assert size == len(PAYLOAD)
+            assert os.path.getsize(path) == len(PAYLOAD)
+            with open(path, "rb") as f:
+                assert f.read() == PAYLOAD
+        finally:
+            await plugin.terminate()
+
+    asyncio.run(scenario())
+
+
+def test_short_body_against_content_range_is_retried(make_plugin, tmp_path):
+    half = len(PAYLOAD) // 2
+
+    async def handler(request, writer):
+        # 第一次只返回前一半，但Content-Range声明的总大小是完整文件
+        range_header = request.headers.get("range")
+        offset = int(range_header[len("bytes="):].split("-")[0]) if range_header else 0
+        end = half if offset == 0 else len(PAYLOAD)
+        await send(writer, 206, PAYLOAD[offset:end], {
+            "Content-Range": f"bytes {offset}-{end - 1}/{len(PAYLOAD)}",
+        })
+
+    async def scenario():
+        plugin = make_plugin()
+        try:
+            async with LocalHTTPServer(handler) as server:
+                path = str(tmp_path / "video.mp4")
+                size = await plugin.download_stream(server.url("/video.mp4"), {}, path, max_retries=1)
+                assert server.requests[1].headers["range"] == f"bytes={half}-"
+            assert size == len(PAYLOAD)
+            with open(path, "rb") as f:
+                assert f.read() == PAYLOAD
+        finally:
+            await plugin.terminate()
+
+    asyncio.run(scenario())
+
+
+def test_oversized_body_is_discarded(make_plugin, tmp_path):
+    async def handler(request, writer):
+        # 内容比Content-Range声明的总大小还多，文件不可信
+        await send(writer, 206, PAYLOAD, {"Content-Range": "bytes 0-999/1000"})
+
+    async def scenario():
+        plugin = make_plugin()
+        try:
+            async with LocalHTTPServer(handler) as server:
+                path = str(tmp_path / "video.mp4")
+                try:
+                    await plugin.download_stream(server.url("/video.mp4"), {}, path, max_retries=0)
+                except Exception as e:
+                    assert "下载失败" in str(e)
+                else:
+                    raise AssertionError("下载应当失败")
+            assert not os.path.exists(path)
+        finally:
+            await plugin.terminate()
+
+    asyncio.run(scenario())
+
+
+def test_memory_does_not_grow_with_file_size(make_plugin, tmp_path):
+    async def peak_for(payload):
+        plugin = make_plugin(download_chunk_kb=64)
+        try:
+            async with LocalHTTPServer(file_server(payload)) as server:
+                path = str(tmp_path / f"video_{len(payload)}.mp4")
+                tracemalloc.start()
+                await plugin.download_stream(server.url("/video.mp4"), {}, path, max_retries=0)
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            return peak
+        finally:
+            await plugin.terminate()
+
+    async def scenario():
+        # 服务端本身持有完整的payload，不计入统计
+        small = PAYLOAD * 2
+        large = PAYLOAD * 16
+        small_peak = await peak_for(small)
+        large_peak = await peak_for(large)
+        # 文件大了8倍，内存峰值应基本不变，且远小于文件大小
+        assert large_peak < small_peak * 2
+        assert large_peak < len(large) / 4
+
+    asyncio.run(scenario())
+
+
+def test_client_error_is_not_retried(make_plugin, tmp_path):
+    async def forbidden(request, writer):
+        await send(writer, 403, b"expired")
+
+    async def scenario():
+        # 使用默认的重试次数
+        plugin = make_plugin()
+        try:
+            async with LocalHTTPServer(forbidden) as server:
+                started = time.perf_counter()
+                with pytest.raises(Exception, match="403"):
+                    await plugin.download_stream(server.url("/video.mp4"), {}, str(tmp_path / "video.mp4"))
+                return len(server.requests), time.perf_counter() - started
+        finally:
+            await plugin.terminate()
+
+    count, seconds = asyncio.run(scenario())
+    assert count == 1
+    assert seconds < 1
+
+
+def test_server_error_is_retried(make_plugin, tmp_path):
+    state = {"requests": 0}
+
+    async def flaky(request, writer):
+        state["requests"] += 1
+        if state["requests"] == 1:
+            await send(writer, 503, b"busy")
+        else:
+            await send(writer, 200, PAYLOAD[:1000])
+
+    async def scenario():
+        plugin = make_plugin()
+        try:
+            async with LocalHTTPServer(flaky) as server:
+                return await plugin.download_stream(server.url("/video.mp4"), {}, str(tmp_path / "video.mp4"))
+        finally:
+            await plugin.terminate()
+
+    assert asyncio.run(scenario()) == 1000
+    assert state["requests"] == 2
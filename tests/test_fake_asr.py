@@ -0,0 +1,24 @@
+import asyncio
+import time
+
+import main
+
+
+def test_delay_scales_with_audio_size(tmp_path):
+    small = tmp_path / "small.m4a"
+    large = tmp_path / "large.m4a"
+    small.write_bytes(b"s" * 64 * 1024)
+    large.write_bytes(b"l" * 1024 * 1024)
+    backend = main.FakeASRBackend(main.Metrics(), delay=0.05, seconds_per_mb=0.4)
+
+    def timed(path):
+        started = time.perf_counter()
+        transcript = asyncio.run(backend.transcribe(str(path)))
+        return transcript, time.perf_counter() - started
+
+    small_transcript, small_seconds = timed(small)
+    large_transcript, large_seconds = timed(large)
+    # 0.05 + 0.4 * 64KB / 1MB = 0.075秒；0.05 + 0.4 = 0.45秒
+    assert 0.075 <= small_seconds < 0.3
+    assert large_seconds >= 0.45
+    assert len(large_transcript.segments) > len(small_transcript.segments)
@@ -0,0 +1,73 @@
+import asyncio
+import json
+
+import main
+from stand_ins import StubContext, StubConversationManager
+
+
+def make_writer(tmp_path, write_delay, max_messages=100):
+    manager = StubConversationManager(write_delay=write_delay)
+    writer = main.HistoryWriter(StubContext(str(tmp_path), conversation_manager=manager),
+                                max_messages=max_messages, flush_delay=0.01)
+    return writer, manager
+
+
+def contents(manager, session="test:session"):
+    return [message["content"] for message in json.loads(manager.histories.get(session, "[]"))]
+
+
+def test_turn_appended_during_flush_is_written(tmp_path):
+    async def scenario():
+        writer, manager = make_writer(tmp_path, write_delay=0.1)
+        writer.append("test:session", "问1", "答1")
+        # 等到第一次写入开始后再追加
+        await asyncio.sleep(0.05)
+        assert writer._flushing
+        writer.append("test:session", "问2", "答2")
+        await asyncio.sleep(0.3)
+        return writer, manager
+
+    writer, manager = asyncio.run(scenario())
+    assert writer.pending == {}
+    assert manager.writes == 2
+    assert contents(manager) == ["问1", "答1", "问2", "答2"]
+
+
+def test_close_during_flush_keeps_records(tmp_path):
+    async def scenario():
+        writer, manager = make_writer(tmp_path, write_delay=0.1)
+        writer.append("test:a", "问1", "答1")
+        writer.append("test:b", "问2", "答2")
+        await asyncio.sleep(0.05)
+        writer.append("test:a", "问3", "答3")
+        await writer.close()
+        return manager
+
+    manager = asyncio.run(scenario())
+    assert contents(manager, "test:a") == ["问1", "答1", "问3", "答3"]
+    assert contents(manager, "test:b") == ["问2", "答2"]
+
+
+def test_close_before_flush_writes_once(tmp_path):
+    async def scenario():
+        writer, manager = make_writer(tmp_path, write_delay=0)
+        writer.flush_delay = 10
+        writer.append("test:session", "问1", "答1")
+        writer.append("test:session", "问2", "答2")
+        await writer.close()
+        return manager
+
+    manager = asyncio.run(scenario())
+    assert manager.writes == 1
+    assert contents(manager) == ["问1", "答1", "问2", "答2"]
+
+
+def test_history_is_trimmed(tmp_path):
+    async def scenario():
+        writer, manager = make_writer(tmp_path, write_delay=0, max_messages=4)
+        for index in range(5):
+            writer.append("test:session", f"问{index}", f"答{index}")
+            await writer.flush()
+        return manager
+
+    assert contents(asyncio.run(scenario())) == ["问3", "答3", "问4", "答4"]
@@ -0,0 +1,76 @@
+import asyncio
+import importlib.util
+import os
+import time
+
+import pytest
+
+import main
+
+
+def scripted_transcribe(model_name, compute_type, language, audio_path):
+    """代替faster-whisper，audio_path为slow时一直占用工作进程，为medium时运行一小段时间"""
+    if audio_path == "slow":
+        time.sleep(60)
+    elif audio_path == "medium":
+        time.sleep(1)
+    return [(0.0, 1.0, f"{model_name} {audio_path}")]
+
+
+@pytest.fixture
+def make_backend(monkeypatch):
+    find_spec = importlib.util.find_spec
+    monkeypatch.setattr(importlib.util, "find_spec",
+                        lambda name, *args: object() if name == "faster_whisper" else find_spec(name, *args))
+    monkeypatch.setattr(main, "_local_transcribe", scripted_transcribe)
+    backends = []
+
+    def factory(workers):
+        backend = main.LocalASRBackend(main.Metrics(), model="tiny", workers=workers, timeout=1.5)
+        backends.append(backend)
+        return backend
+
+    yield factory
+    for backend in backends:
+        asyncio.run(backend.close())
+
+
+def wait_exited(pid, seconds=5):
+    """等待进程退出并被回收"""
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def test_timeout_recycles_only_its_slot(make_backend):
+    backend = make_backend(workers=2)
+
+    async def scenario():
+        slow = asyncio.ensure_future(backend.transcribe("slow"))
+        await asyncio.sleep(1)
+        # medium在另一个进程中运行，slow超时重建进程时它还没有结束
+        medium = asyncio.ensure_future(backend.transcribe("medium"))
+        await asyncio.sleep(0.2)
+        pids = list(backend.worker_pids)
+        with pytest.raises(Exception, match="字幕识别超时"):
+            await slow
+        transcript = await medium
+
+        # 超时的进程被结束，之后的任务不必等待它运行完
+        started = time.perf_counter()
+        after = await asyncio.gather(backend.transcribe("fast.wav"), backend.transcribe("fast2.wav"))
+        return pids, transcript, after, time.perf_counter() - started
+
+    pids, transcript, after, seconds = asyncio.run(scenario())
+    slow_pid, medium_pid = pids
+    assert transcript.segments == [(0.0, 1.0, "tiny medium")]
+    assert [item.segments[0][2] for item in after] == ["tiny fast.wav", "tiny fast2.wav"]
+    assert seconds < 10
+    assert wait_exited(slow_pid)
+    assert medium_pid in backend.worker_pids and slow_pid not in backend.worker_pids
+    assert backend.metrics.counters["asr_local_recycled"] == 1
@@ -0,0 +1,88 @@
+import asyncio
+
+import main
+from stand_ins import StubEvent
+
+# 总时长超过上限，但P1很短
+MULTI_PART = {
+    "bvid": "BV1GJ411x7h7", "aid": 1, "cid": 101, "title": "合集", "desc": "", "duration": 4000,
+    "pages": [
+        {"cid": 101, "page": 1, "part": "上", "duration": 300},
+        {"cid": 102, "page": 2, "part": "下", "duration": 3700},
+    ],
+}
+SINGLE_PART = {
+    "bvid": "BV17x411w7KC", "aid": 2, "cid": 201, "title": "单P", "desc": "", "duration": 600,
+    "pages": [{"cid": 201, "page": 1, "part": "单P", "duration": 600}],
+}
+
+
+def stub_video_stages(plugin, info):
+    """替换视频信息和字幕获取，记录请求字幕的cid"""
+    requested = []
+
+    async def get_info(v):
+        return info
+
+    async def get_best_subtitle(v, cid, info):
+        requested.append(cid)
+        yield None, "测试中不获取字幕"
+
+    plugin.info_cache.get = get_info
+    plugin.get_best_subtitle = get_best_subtitle
+    return requested
+
+
+def test_first_page_uses_its_own_duration(make_plugin):
+    async def scenario():
+        plugin = make_plugin(max_duration=3600)
+        try:
+            requested = stub_video_stages(plugin, MULTI_PART)
+            first = await plugin.review_video(StubEvent(), MULTI_PART["bvid"], 1)
+            second = await plugin.review_video(StubEvent(), MULTI_PART["bvid"], 2)
+            missing = await plugin.review_video(StubEvent(), MULTI_PART["bvid"], 3)
+        finally:
+            await plugin.terminate()
+        return requested, first, second, missing
+
+    requested, first, second, missing = asyncio.run(scenario())
+    assert requested == [101]
+    assert first == "视频《合集 P1 上》字幕获取失败: 测试中不获取字幕"
+    assert "时长超过60分钟（61分40秒）" in second
+    assert missing == "视频《合集》只有2个分P，找不到P3"
+
+
+def test_single_part_title_unchanged(make_plugin):
+    async def scenario():
+        plugin = make_plugin()
+        try:
+            stub_video_stages(plugin, SINGLE_PART)
+            return await plugin.review_video(StubEvent(), SINGLE_PART["bvid"], 1)
+        finally:
+            await plugin.terminate()
+
+    assert asyncio.run(scenario()) == "视频《单P》字幕获取失败: 测试中不获取字幕"
+
+
+def test_prewarm_uses_first_page_duration(make_plugin, monkeypatch):
+    class User:
+        def __init__(self, uid, credential=None):
+            self.uid = uid
+
+        async def get_videos(self, ps=30):
+            return {"list": {"vlist": [{"bvid": MULTI_PART["bvid"]}]}}
+
+    monkeypatch.setattr(main.user, "User", User)
+
+    async def scenario():
+        plugin = make_plugin(max_duration=3600)
+        try:
+            requested = stub_video_stages(plugin, MULTI_PART)
+            await plugin._prewarm_uploader("1")
+        finally:
+            await plugin.terminate()
+        return requested, plugin.prewarm_stats
+
+    requested, stats = asyncio.run(scenario())
+    assert requested == [101]
+    assert stats["skipped"] == 0
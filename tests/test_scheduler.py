@@ -0,0 +1,104 @@
+import asyncio
+
+import pytest
+
+import main
+
+
+def recorder(order):
+    async def job(label, hold=None):
+        order.append(label)
+        if hold is not None:
+            await hold.wait()
+        return label
+
+    return job
+
+
+def test_round_robin_between_sessions():
+    async def scenario():
+        order = []
+        job = recorder(order)
+        scheduler = main.ReviewScheduler(workers=1, max_pending=20)
+        try:
+            futures = [scheduler.submit("group:a", job, f"a{index}")[0] for index in range(1, 5)]
+            futures += [scheduler.submit("group:b", job, f"b{index}")[0] for index in range(1, 3)]
+            futures.append(scheduler.submit("group:c", job, "c1")[0])
+            await asyncio.gather(*futures)
+        finally:
+            await scheduler.close()
+        return order
+
+    # 先提交的group:a不会让后来的会话等到它的任务全部完成
+    assert asyncio.run(scenario()) == ["a1", "b1", "c1", "a2", "b2", "a3", "a4"]
+
+
+def test_queue_positions():
+    async def scenario():
+        job = recorder([])
+        hold = asyncio.Event()
+        scheduler = main.ReviewScheduler(workers=1, max_pending=20)
+        try:
+            # 第一个任务被工作协程取走后一直运行，之后的任务都在排队
+            running, _ = scheduler.submit("group:a", job, "a0", hold)
+            await asyncio.sleep(0)
+            assert scheduler.running == 1 and scheduler.pending == 0
+            positions = [scheduler.submit("group:a", job, f"a{index}")[1] for index in range(1, 4)]
+            positions.append(scheduler.submit("group:b", job, "b1")[1])
+            positions.append(scheduler.submit("group:b", job, "b2")[1])
+            positions.append(scheduler.submit("group:c", job, "c1")[1])
+            hold.set()
+            await running
+        finally:
+            await scheduler.close()
+        return positions
+
+    # a: [a1 a2 a3]，b1排在a1之后，b2排在a2之后，c1排在a1、b1之后
+    assert asyncio.run(scenario()) == [1, 2, 3, 2, 4, 3]
+
+
+def test_queue_full():
+    async def scenario():
+        job = recorder([])
+        hold = asyncio.Event()
+        scheduler = main.ReviewScheduler(workers=1, max_pending=2)
+        try:
+            running, _ = scheduler.submit("group:a", job, "a0", hold)
+            await asyncio.sleep(0)
+            scheduler.submit("group:a", job, "a1")
+            scheduler.submit("group:b", job, "b1")
+            with pytest.raises(main.QueueFullError):
+                scheduler.submit("group:c", job, "c1")
+            assert scheduler.pending == 2
+
+            # 排队的任务开始执行后又可以提交
+            hold.set()
+            await running
+            while scheduler.pending:
+                await asyncio.sleep(0)
+            future, position = scheduler.submit("group:c", job, "c1")
+            assert position == 1
+            assert await future == "c1"
+        finally:
+            await scheduler.close()
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_job_is_skipped():
+    async def scenario():
+        order = []
+        job = recorder(order)
+        scheduler = main.ReviewScheduler(workers=1, max_pending=20)
+        try:
+            first, _ = scheduler.submit("group:a", job, "a1")
+            second, _ = scheduler.submit("group:a", job, "a2")
+            third, _ = scheduler.submit("group:a", job, "a3")
+            second.cancel()
+            await first
+            await third
+        finally:
+            await scheduler.close()
+        return order
+
+    assert asyncio.run(scenario()) == ["a1", "a3"]
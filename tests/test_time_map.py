@@ -0,0 +1,98 @@
+import asyncio
+
+import pytest
+
+import main
+
+
+def silencedetect_output(silences):
+    """生成silencedetect的日志，end为None表示静音一直持续到结尾"""
+    lines = []
+    for start, end in silences:
+        lines.append(f"[silencedetect @ 0x55d0c8] silence_start: {start}")
+        if end is not None:
+            lines.append(f"[silencedetect @ 0x55d0c8] silence_end: {end} | silence_duration: {end - start:.3f}")
+    return "\n".join(lines)
+
+
+def detect(make_plugin, silences, duration):
+    async def scenario():
+        plugin = make_plugin(trim_silence=True, silence_min_seconds=0.3)
+
+        async def run_ffmpeg(args, timeout=None, loglevel='error'):
+            return silencedetect_output(silences)
+
+        plugin.run_ffmpeg = run_ffmpeg
+        try:
+            return await plugin._detect_speech_spans("audio.m4a", duration)
+        finally:
+            await plugin.terminate()
+
+    return asyncio.run(scenario())
+
+
+def assert_disjoint(spans):
+    for (_, previous_end), (start, _) in zip(spans, spans[1:]):
+        assert start > previous_end
+
+
+def test_short_silences_are_merged(make_plugin):
+    # 0.3秒的静音短于两端保留的0.4秒，不应产生重叠的时间段
+    spans = detect(make_plugin, [(5.0, 5.3), (10.0, 30.0), (33.0, 33.3)], 40.0)
+    assert spans == [(0.0, 10.2), (29.8, 40.0)]
+    assert_disjoint(spans)
+
+
+def test_only_short_silences_are_not_trimmed(make_plugin):
+    assert detect(make_plugin, [(5.0, 5.3), (7.0, 7.3), (9.0, 9.3)], 40.2) is None
+
+
+def test_leading_and_trailing_silence(make_plugin):
+    spans = detect(make_plugin, [(0.0, 8.0), (20.0, None)], 60.0)
+    assert spans == [(0.0, 0.2), (7.8, 20.2)]
+
+
+def test_no_silence(make_plugin):
+    assert detect(make_plugin, [], 60.0) is None
+
+
+def test_to_original():
+    time_map = main.TimeMap([(0, 10), (30, 40), (50, 55)])
+    assert time_map.duration == 25
+    assert time_map.to_original(5) == 5
+    # 时间段之间的边界对应下一段的开始
+    assert time_map.to_original(10) == 30
+    assert time_map.to_original(12.5) == 32.5
+    assert time_map.to_original(22) == 52
+    # 超出裁剪后音频长度的时间不超过最后一段的结尾
+    assert time_map.to_original(30) == 55
+
+
+def test_to_original_matches_detected_spans(make_plugin):
+    spans = detect(make_plugin, [(5.0, 5.3), (10.0, 30.0), (33.0, 33.3)], 40.0)
+    time_map = main.TimeMap(spans)
+    # 裁剪后的音频长度等于保留时间段的总长，第二段开始处对应原视频29.8秒
+    assert time_map.duration == pytest.approx(20.4)
+    assert time_map.to_original(10.2) == pytest.approx(29.8)
+    assert time_map.to_original(20.4) == pytest.approx(40.0)
+
+
+def test_empty_time_map_is_identity():
+    assert main.TimeMap([]).to_original(12.5) == 12.5
+
+
+def test_remap_transcript():
+    time_map = main.TimeMap([(0, 10), (30, 40)])
+    transcript = main.Transcript([(1, 4, "第一句"), (9, 12, "第二句")], source="asr")
+    transcript.gaps = [(15, 18)]
+    remapped = time_map.remap(transcript)
+    assert remapped.segments == [(1.0, 4.0, "第一句"), (9.0, 32.0, "第二句")]
+    assert remapped.gaps == [(35.0, 38.0)]
+    assert remapped.source == "asr"
+
+
+def test_dump_and_load():
+    time_map = main.TimeMap([(0, 10.5), (30.25, 40)])
+    loaded = main.TimeMap.load(time_map.dump())
+    assert loaded.spans == time_map.spans
+    assert loaded.to_original(11) == time_map.to_original(11) == 30.75
@@ -0,0 +1,28 @@
+import main
+
+
+def test_dump_load_round_trip():
+    transcript = main.Transcript([(0.121, 5.121, "永不放弃你"), (18.55, 22.275, "我们对爱情并不陌生")], source="native")
+    loaded = main.Transcript.load(transcript.dump())
+    assert loaded.segments == transcript.segments
+    assert loaded.source == "cache"
+
+
+def test_multiline_content_survives_round_trip():
+    transcript = main.Transcript([(1, 2, "第一行\n第二行"), (3, 4, "第三行\r\n  第四行\n")], source="native")
+    assert transcript.segments == [(1.0, 2.0, "第一行 第二行"), (3.0, 4.0, "第三行 第四行")]
+    assert main.Transcript.load(transcript.dump()).segments == transcript.segments
+
+
+def test_content_with_separator_survives_round_trip():
+    transcript = main.Transcript([(1, 2, "时间 -> 进度: 50%")])
+    assert main.Transcript.load(transcript.dump()).segments == [(1.0, 2.0, "时间 -> 进度: 50%")]
+
+
+def test_blank_segments_are_dropped():
+    assert main.Transcript([(1, 2, " \n "), (3, 4, "内容")]).segments == [(3.0, 4.0, "内容")]
+
+
+def test_load_joins_continuation_lines_from_old_cache():
+    text = "1 -> 2: 第一行\n第二行\n3 -> 4: 第三行"
+    assert main.Transcript.load(text).segments == [(1.0, 2.0, "第一行 第二行"), (3.0, 4.0, "第三行")]
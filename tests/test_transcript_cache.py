@@ -0,0 +1,138 @@
+import os
+
+import pytest
+
+import main
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(main.time, "time", clock)
+    return clock
+
+
+def make_cache(tmp_path, transcript_ttl=3600, media_ttl=600, max_bytes=10 ** 9):
+    subtitle_dir = tmp_path / "subtitles"
+    subtitle_dir.mkdir(exist_ok=True)
+    return main.TranscriptCache(str(tmp_path / "cache.db"), str(subtitle_dir), transcript_ttl, media_ttl, max_bytes)
+
+
+def transcript(text):
+    return main.Transcript([(0, 1, text)])
+
+
+def media_file(tmp_path, name, size=1000):
+    path = str(tmp_path / name)
+    with open(path, "wb") as f:
+        f.write(b"m" * size)
+    return path
+
+
+def rows(cache, table):
+    return cache.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+def test_expired_transcripts_and_media_are_purged(tmp_path, clock):
+    cache = make_cache(tmp_path, transcript_ttl=100, media_ttl=50)
+    path = cache.put("BV1", 1, transcript("字幕"))
+    media = media_file(tmp_path, "BV2_2.m4a")
+    cache.track_media(media, "BV2", 2)
+    cache.close()
+
+    clock.now += 200
+    # 打开缓存时清理过期的记录和文件
+    cache = make_cache(tmp_path, transcript_ttl=100, media_ttl=50)
+    assert not os.path.exists(path)
+    assert not os.path.exists(media)
+    assert rows(cache, "transcripts") == 0
+    assert rows(cache, "media") == 0
+    assert cache.stats["expired"] == 1
+    cache.close()
+
+
+def test_expired_transcript_is_a_miss(tmp_path, clock):
+    cache = make_cache(tmp_path, transcript_ttl=100, media_ttl=50)
+    path = cache.put("BV1", 1, transcript("字幕"))
+    media = media_file(tmp_path, "BV1_1.m4a")
+    cache.track_media(media, "BV1", 1)
+    assert cache.get("BV1", 1).to_txt().endswith("字幕")
+
+    clock.now += 60
+    assert not cache.has_media(media)
+    assert not os.path.exists(media)
+
+    clock.now += 60
+    assert not cache.contains("BV1", 1)
+    assert cache.get("BV1", 1) is None
+    assert not os.path.exists(path)
+    assert cache.stats == {"hits": 1, "misses": 1, "expired": 1, "evicted": 0}
+    cache.close()
+
+
+def test_eviction_follows_last_access(tmp_path, clock):
+    cache = make_cache(tmp_path)
+    first = cache.put("BV1", 1, transcript("第一个视频的字幕"))
+    clock.now += 1
+    media = media_file(tmp_path, "BV3_3.m4a")
+    cache.track_media(media, "BV3", 3)
+    clock.now += 1
+    second = cache.put("BV2", 2, transcript("第二个视频的字幕"))
+    clock.now += 1
+    # 读取后BV1变为最近使用
+    cache.get("BV1", 1)
+
+    # 最久未使用的是媒体文件，其次是BV2的字幕
+    cache.max_bytes = cache.total_size() - 1
+    cache.evict()
+    assert not os.path.exists(media)
+    assert os.path.exists(first) and os.path.exists(second)
+
+    cache.max_bytes = cache.total_size() - 1
+    cache.evict()
+    assert not os.path.exists(second)
+    assert cache.get("BV2", 2) is None
+    assert os.path.exists(first)
+    assert cache.stats["evicted"] == 2
+    cache.close()
+
+
+def test_put_removes_media_of_same_video(tmp_path, clock):
+    cache = make_cache(tmp_path)
+    audio = media_file(tmp_path, "BV1_1_speech.m4a")
+    video = media_file(tmp_path, "BV1_1.mp4")
+    other = media_file(tmp_path, "BV1_2.mp4")
+    cache.track_media(audio, "BV1", 1)
+    cache.track_media(video, "BV1", 1)
+    cache.track_media(other, "BV1", 2)
+
+    cache.put("BV1", 1, transcript("字幕"))
+    assert not os.path.exists(audio)
+    assert not os.path.exists(video)
+    assert os.path.exists(other)
+    assert [row[0] for row in cache.conn.execute("SELECT path FROM media")] == [other]
+    cache.close()
+
+
+def test_contains_is_not_a_hit(tmp_path, clock):
+    cache = make_cache(tmp_path)
+    cache.put("BV1", 1, transcript("字幕"))
+    clock.now += 10
+
+    assert cache.contains("BV1", 1)
+    assert not cache.contains("BV1", 2)
+    assert cache.stats["hits"] == 0 and cache.stats["misses"] == 0
+    # 不更新访问时间，不影响淘汰顺序
+    accessed_at, hits = cache.conn.execute(
+        "SELECT accessed_at, hits FROM transcripts WHERE bvid = 'BV1' AND cid = 1"
+    ).fetchone()
+    assert accessed_at == 1000.0 and hits == 0
+    cache.close()
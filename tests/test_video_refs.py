@@ -0,0 +1,67 @@
+import asyncio
+import re
+
+import pytest
+
+import main
+from stand_ins import LocalHTTPServer, route_to, send
+
+MESSAGE_REGEX = re.compile(main.VIDEO_MESSAGE_REGEX)
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("点评一下BV1GJ411x7h7", [("BV1GJ411x7h7", 1)]),
+    ("https://www.bilibili.com/video/BV1GJ411x7h7/?spm_id_from=333.1007", [("BV1GJ411x7h7", 1)]),
+    ("https://www.bilibili.com/video/BV1GJ411x7h7?p=3", [("BV1GJ411x7h7", 3)]),
+    ("https://www.bilibili.com/video/BV1GJ411x7h7/?vd_source=abc&p=2 看看", [("BV1GJ411x7h7", 2)]),
+    ("BV1GJ411x7h7?p=0", [("BV1GJ411x7h7", 1)]),
+    ("av170001", [("BV17x411w7KC", 1)]),
+    ("https://www.bilibili.com/video/av170001?p=2", [("BV17x411w7KC", 2)]),
+    ("先看BV1GJ411x7h7再看BV17x411w7KC?p=4", [("BV1GJ411x7h7", 1), ("BV17x411w7KC", 4)]),
+    ("BV1GJ411x7h7,BV17x411w7KC?p=4", [("BV1GJ411x7h7", 1), ("BV17x411w7KC", 4)]),
+])
+def test_parse_video_refs(text, expected):
+    assert MESSAGE_REGEX.match(text)
+    assert main.BiliSumPlugin._parse_video_refs(text) == expected
+
+
+@pytest.mark.parametrize("text", [
+    "今天天气不错",
+    "nav12345",
+    "https://example.com/navigation/av12",
+    "BV1GJ411x7h",
+    "brave12345 javelin",
+])
+def test_non_matches(text):
+    assert not MESSAGE_REGEX.match(text)
+    assert main.BiliSumPlugin._parse_video_refs(text) == []
+
+
+@pytest.mark.parametrize("text", ["看看 b23.tv/abc123", "https://bili2233.cn/xyz789 这个"])
+def test_short_links_pass_message_filter(text):
+    assert MESSAGE_REGEX.match(text)
+
+
+def test_find_videos_resolves_short_links(make_plugin):
+    async def handler(request, writer):
+        await send(writer, 302, headers={
+            "Location": "https://www.bilibili.com/video/BV1GJ411x7h7?p=2&share_source=copy_web"
+        })
+
+    async def scenario():
+        plugin = make_plugin()
+        try:
+            async with LocalHTTPServer(handler) as server:
+                await route_to(plugin, server)
+                first = await plugin.find_videos("看看 https://b23.tv/abc123 和 BV1GJ411x7h7?p=2")
+                second = await plugin.find_videos("b23.tv/abc123")
+                return first, second, len(server.requests)
+        finally:
+            await plugin.terminate()
+
+    first, second, requests = asyncio.run(scenario())
+    # 短链接与BV号指向同一分P时去重
+    assert first == [("BV1GJ411x7h7", 2)]
+    assert second == [("BV1GJ411x7h7", 2)]
+    # 解析结果被缓存
+    assert requests == 1